@@ -0,0 +1,47 @@
+from decimal import Decimal
+from typing import Dict, List
+
+from django.db.models import Avg, Count, Max, Min, Q
+
+# Estremi inferiori inclusi, superiori esclusi; None = illimitato
+SAVING_BUCKETS = [(0, 25), (25, 50), (50, 75), (75, None)]
+RATING_BUCKETS = [(0, 2), (2, 4), (4, 6), (6, 8), (8, None)]
+
+
+def _bucket_filter(field: str, lower, upper) -> Q:
+    condition = Q(**{f"{field}__gte": Decimal(lower)})
+    if upper is not None:
+        condition &= Q(**{f"{field}__lt": Decimal(upper)})
+    return condition
+
+
+def _bucket_annotations(field: str, buckets) -> Dict:
+    return {
+        f"{field}_bucket_{index}": Count('pk', filter=_bucket_filter(field, lower, upper))
+        for index, (lower, upper) in enumerate(buckets)
+    }
+
+
+def deal_aggregates(queryset) -> List[Dict]:
+    """Statistiche per store calcolate dal database con una sola query raggruppata."""
+    rows = queryset.order_by().values('store__store_id', 'store__store_name').annotate(
+        count=Count('pk'),
+        min_sale_price=Min('sale_price'),
+        avg_sale_price=Avg('sale_price'),
+        max_sale_price=Max('sale_price'),
+        avg_saving=Avg('saving'),
+        avg_deal_rating=Avg('deal_rating'),
+        **_bucket_annotations('saving', SAVING_BUCKETS),
+        **_bucket_annotations('deal_rating', RATING_BUCKETS),
+    ).order_by('store__store_id')
+
+    results = []
+    for row in rows:
+        row['saving_histogram'] = [
+            (lower, upper, row.pop(f"saving_bucket_{index}")) for index, (lower, upper) in enumerate(SAVING_BUCKETS)
+        ]
+        row['rating_distribution'] = [
+            (lower, upper, row.pop(f"deal_rating_bucket_{index}")) for index, (lower, upper) in enumerate(RATING_BUCKETS)
+        ]
+        results.append(row)
+    return results
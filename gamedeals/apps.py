@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class GamedealsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'gamedeals'
+
+    def ready(self):
+        from django.db.models.signals import post_migrate
+        from .search import reinstall_after_migrate
+        post_migrate.connect(reinstall_after_migrate, sender=self, dispatch_uid='gamedeals.search.install')
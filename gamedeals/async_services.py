@@ -0,0 +1,136 @@
+import asyncio
+import logging
+import weakref
+from typing import Dict, List, Optional
+
+import httpx
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from .ratelimit import RateLimiter, RateLimitExceeded
+from .services import RETRY_STATUS_CODES, CheapSharkClient, DealListService, StoreListService
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncCheapSharkClient:
+    """
+    Variante non bloccante di CheapSharkClient per il percorso ASGI: stesse regole
+    di retry e backoff, ma l'attesa non occupa un thread.
+    """
+
+    # Chiave sull'oggetto loop: alla sua chiusura e raccolta la voce sparisce, e un
+    # nuovo loop non può ereditare un client legato a uno chiuso
+    _clients: 'weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]' = weakref.WeakKeyDictionary()
+
+    @staticmethod
+    def _setting(name: str, default):
+        return getattr(settings, name, default)
+
+    @classmethod
+    def get_client(cls) -> httpx.AsyncClient:
+        # Un AsyncClient è legato all'event loop che lo ha creato
+        loop = asyncio.get_running_loop()
+        client = cls._clients.get(loop)
+        if client is None or client.is_closed:
+            pool_size = cls._setting('CHEAPSHARK_POOL_MAXSIZE', cls._setting('CHEAPSHARK_MAX_CONCURRENCY', 4))
+            client = httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+            )
+            cls._clients[loop] = client
+        return client
+
+    @classmethod
+    async def aclose(cls):
+        client = cls._clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aclose()
+
+    @classmethod
+    async def wait_for_token(cls):
+        # L'attesa non occupa thread: si aspetta che il debito del bucket rientri
+        while True:
+            try:
+                wait = await sync_to_async(RateLimiter.acquire)()
+            except RateLimitExceeded as e:
+                await asyncio.sleep(e.retry_after)
+                continue
+            if wait:
+                await asyncio.sleep(wait)
+            return
+
+    @classmethod
+    async def get(cls, url: str, params: Optional[Dict] = None, timeout: Optional[float] = None) -> httpx.Response:
+        max_retries = cls._setting('CHEAPSHARK_MAX_RETRIES', 3)
+        timeout = timeout or cls._setting('CHEAPSHARK_TIMEOUT', 10)
+        client = cls.get_client()
+
+        attempt = 0
+        while True:
+            response = None
+            await cls.wait_for_token()
+            try:
+                response = await client.get(url, params=params, timeout=timeout)
+                if response.status_code not in RETRY_STATUS_CODES or attempt >= max_retries:
+                    response.raise_for_status()
+                    return response
+                reason = f"HTTP {response.status_code}"
+            except httpx.TransportError as e:
+                if attempt >= max_retries:
+                    raise
+                reason = str(e)
+
+            delay = CheapSharkClient.retry_delay(attempt, response)
+            attempt += 1
+            logger.warning(f"Richiesta a {url} fallita ({reason}), tentativo {attempt}/{max_retries} tra {delay:.2f}s")
+            await asyncio.sleep(delay)
+
+
+class AsyncDealListService:
+    @classmethod
+    async def fetch_games(cls, store_id: Optional[str] = None) -> List[Dict]:
+        try:
+            params = {}
+            if store_id:
+                params['storeID'] = store_id
+            response = await AsyncCheapSharkClient.get(DealListService.BASE_URL, params=params)
+            games_data = response.json()
+            logger.info(f"Recuperati {len(games_data)} giochi dall'API")
+            return games_data
+        except httpx.HTTPError as e:
+            logger.error(f"Errore nel recupero dei giochi: {e}")
+            return []
+
+    @classmethod
+    async def fetch_stores_games(cls, store_ids: List[str], max_concurrency: Optional[int] = None) -> Dict[str, List[Dict]]:
+        semaphore = asyncio.Semaphore(max_concurrency or getattr(settings, 'CHEAPSHARK_MAX_CONCURRENCY', 4))
+
+        async def fetch(store_id):
+            async with semaphore:
+                logger.info(f"Recupero giochi per store {store_id}")
+                return await cls.fetch_games(store_id=store_id)
+
+        results = await asyncio.gather(*(fetch(store_id) for store_id in store_ids))
+        return dict(zip(store_ids, results))
+
+    @classmethod
+    async def get_game_deals(cls, game_id: str) -> Optional[Dict]:
+        try:
+            response = await AsyncCheapSharkClient.get(DealListService.BASE_URL, params={'id': game_id})
+            return response.json()
+        except httpx.HTTPError as e:
+            logger.error(f"Errore nel recupero del gioco {game_id}: {e}")
+            return None
+
+
+class AsyncStoreListService:
+    @classmethod
+    async def fetch_stores(cls) -> List[Dict]:
+        try:
+            response = await AsyncCheapSharkClient.get(StoreListService.BASE_URL)
+            stores_data = response.json()
+            logger.info(f"Recuperati {len(stores_data)} negozi dall'API")
+            return stores_data
+        except httpx.HTTPError as e:
+            logger.error(f"Errore nel recupero dei negozi: {e}")
+            return []
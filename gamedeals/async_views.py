@@ -0,0 +1,174 @@
+"""
+Percorso di lettura nativo asincrono per ASGI: elenco e dettaglio dei deal e
+elenco degli store. Stesso output e stessa cache delle viste DRF, ma con l'ORM
+asincrono di Django, così un worker serve molti client lenti senza un thread ciascuno.
+"""
+import logging
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django_filters.utils import translate_validation
+from django.http import JsonResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+from django.views.decorators.http import require_GET
+from rest_framework.exceptions import AuthenticationFailed, ValidationError
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+
+from .caching import aget_data_version, get_cache, response_cache_key, response_etag
+from .models import DealsList, StoreInfo
+from .pagination import DealsKeysetPagination
+from .search import get_search_backend
+from .serializers import DealsListReadSerializer
+from .topdeals import landing_deals
+from .views import DealsFilter, DealsListViewSet, has_deal_filters
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LIMIT = 8
+
+
+async def authenticate(request):
+    # Stessa autenticazione JWT delle viste DRF; solo la lettura dell'utente tocca il database
+    result = await sync_to_async(JWTAuthentication().authenticate)(request)
+    return result[0] if result else None
+
+
+def _get_int(request, name, default):
+    try:
+        return max(0, int(request.GET[name]))
+    except (KeyError, ValueError):
+        return default
+
+
+def build_deals_queryset(request):
+    # Costruzione sincrona (DealsFilter, backend di ricerca); la valutazione avviene in modo asincrono.
+    # Filtri non validi sollevano ValidationError, con gli stessi errori di DjangoFilterBackend
+    filterset = DealsFilter(request.GET, queryset=DealsList.objects.select_related('store'))
+    if not filterset.is_valid():
+        raise translate_validation(filterset.errors)
+    queryset = filterset.qs
+
+    ordering = [
+        field.strip() for field in request.GET.get('ordering', '').split(',')
+        if field.strip().lstrip('-') in DealsListViewSet.ordering_fields
+    ]
+    if ordering:
+        queryset = queryset.order_by(*ordering)
+
+    term = request.GET.get('search', '').strip()
+    if term:
+        ranked_queryset, ranked = get_search_backend().search(queryset, term)
+        queryset = ranked_queryset.order_by(*ordering) if ranked and ordering else ranked_queryset
+    return queryset
+
+
+async def cached_json(request, scope, audience, build_data):
+    version = await aget_data_version()
+    etag = response_etag(request, scope, version.version, audience=audience)
+    last_modified = int(version.updated_at.timestamp())
+
+    # Prima della costruzione vale solo l'ETag (specifico dell'URL), come in CachedResponseMixin
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        cache = get_cache()
+        key = response_cache_key(request, scope, version.version, audience=audience)
+        data = await cache.aget(key)
+        if data is None:
+            data, status = await build_data()
+            if status != 200:
+                return JsonResponse(data, status=status)
+            if audience == 'auth':
+                timeout = getattr(settings, 'DEALS_CACHE_TIMEOUT', 300)
+            else:
+                timeout = getattr(settings, 'DEALS_CACHE_ANONYMOUS_TIMEOUT', 60)
+            await cache.aset(key, data, timeout=timeout)
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified, response=JsonResponse(data, safe=False)
+        )
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    patch_vary_headers(response, ['Authorization'])
+    return response
+
+
+def _unauthorized(error):
+    detail = error.detail if isinstance(error.detail, dict) else {'detail': error.detail}
+    return JsonResponse(detail, status=401)
+
+
+@require_GET
+async def deals_list(request):
+    try:
+        user = await authenticate(request)
+    except (InvalidToken, AuthenticationFailed) as e:
+        return _unauthorized(e)
+    audience = 'auth' if user else 'anon'
+
+    async def build_data():
+        try:
+            queryset = await sync_to_async(build_deals_queryset)(request)
+        except ValidationError as e:
+            return e.detail, 400
+
+        if user is None:
+            deals = await sync_to_async(landing_deals)(queryset, filtered=has_deal_filters(request.GET))
+            return {'results': DealsListReadSerializer(deals, many=True).data}, 200
+
+        if DealsKeysetPagination.is_requested_by(request.GET):
+            # Solo limit/offset: la paginazione a cursore resta sulle viste DRF
+            return {
+                DealsKeysetPagination.mode_query_param: [
+                    "Paginazione a cursore non supportata su questo endpoint: usare /api/deals/."
+                ]
+            }, 400
+
+        limit = _get_int(request, 'limit', DEFAULT_LIMIT) or DEFAULT_LIMIT
+        offset = _get_int(request, 'offset', 0)
+        count = await queryset.acount()
+        deals = [deal async for deal in queryset[offset:offset + limit]]
+
+        url = request.build_absolute_uri()
+        next_url = None
+        if offset + limit < count:
+            next_url = replace_query_param(replace_query_param(url, 'limit', limit), 'offset', offset + limit)
+        previous_url = None
+        if offset > 0:
+            previous_url = replace_query_param(url, 'limit', limit)
+            if offset - limit <= 0:
+                previous_url = remove_query_param(previous_url, 'offset')
+            else:
+                previous_url = replace_query_param(previous_url, 'offset', offset - limit)
+
+        return {
+            'count': count,
+            'next': next_url,
+            'previous': previous_url,
+            'results': DealsListReadSerializer(deals, many=True).data,
+        }, 200
+
+    return await cached_json(request, 'async-deals', audience, build_data)
+
+
+@require_GET
+async def deal_detail(request, pk):
+    async def build_data():
+        try:
+            deal = await DealsList.objects.select_related('store').aget(pk=pk)
+        except DealsList.DoesNotExist:
+            return {'detail': 'Non trovato.'}, 404
+        return DealsListReadSerializer(deal).data, 200
+
+    return await cached_json(request, 'async-deals', 'anon', build_data)
+
+
+@require_GET
+async def stores_list(request):
+    async def build_data():
+        stores = [store async for store in StoreInfo.objects.order_by('pk')]
+        return [DealsListReadSerializer.store_representation(store) for store in stores], 200
+
+    return await cached_json(request, 'async-store', 'anon', build_data)
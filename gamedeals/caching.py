@@ -0,0 +1,138 @@
+import hashlib
+import logging
+from typing import Optional
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import F
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import DataVersion
+
+logger = logging.getLogger(__name__)
+
+DATA_VERSION_NAME = 'catalogue'
+
+
+def get_cache():
+    return caches[getattr(settings, 'DEALS_CACHE_ALIAS', 'default')]
+
+
+def get_data_version() -> DataVersion:
+    # Una sola riga letta per chiave primaria: condivisa da tutti i worker,
+    # a differenza di un contatore tenuto in una cache locale al processo
+    version, _ = DataVersion.objects.get_or_create(name=DATA_VERSION_NAME)
+    return version
+
+
+async def aget_data_version() -> DataVersion:
+    version, _ = await DataVersion.objects.aget_or_create(name=DATA_VERSION_NAME)
+    return version
+
+
+def get_generation() -> int:
+    return get_data_version().version
+
+
+def bump_generation() -> int:
+    # Le chiavi includono la generazione: incrementarla rende irraggiungibili
+    # tutte le risposte precedenti, che poi scadono per TTL o per LRU
+    updated = DataVersion.objects.filter(name=DATA_VERSION_NAME).update(
+        version=F('version') + 1, updated_at=timezone.now()
+    )
+    if not updated:
+        get_data_version()
+    generation = get_generation()
+    logger.info(f"Cache delle risposte invalidata (generazione {generation})")
+    return generation
+
+
+def _audience(request) -> str:
+    return 'auth' if request.user.is_authenticated else 'anon'
+
+
+def request_digest(request) -> str:
+    # request.GET vale sia per le richieste DRF sia per le viste Django asincrone
+    params = sorted(
+        (name, value)
+        for name, values in request.GET.lists()
+        for value in values
+        if value != ''
+    )
+    # L'host entra nel digest perché i link next/previous della paginazione sono assoluti
+    return hashlib.sha1(repr((request.get_host(), request.path, params)).encode()).hexdigest()
+
+
+def response_cache_key(request, scope: str, generation: int, audience: Optional[str] = None) -> str:
+    return f"gamedeals:{scope}:{generation}:{audience or _audience(request)}:{request_digest(request)}"
+
+
+def response_etag(request, scope: str, generation: int, audience: Optional[str] = None) -> str:
+    # Un validatore per URL: l'ETag di /api/deals/1/ non deve valere per /api/deals/2/
+    return quote_etag(f"{scope}-{generation}-{audience or _audience(request)}-{request_digest(request)[:16]}")
+
+
+class CachedResponseMixin:
+    cache_scope = None
+
+    def get_cache_timeout(self, request):
+        if request.user.is_authenticated:
+            return getattr(settings, 'DEALS_CACHE_TIMEOUT', 300)
+        return getattr(settings, 'DEALS_CACHE_ANONYMOUS_TIMEOUT', 60)
+
+    def _add_validators(self, response, etag, last_modified):
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        patch_vary_headers(response, ['Authorization'])
+        return response
+
+    def cached_response(self, request, build_response):
+        scope = self.cache_scope or self.basename
+        version = get_data_version()
+        self.data_version = version
+
+        # I validatori derivano dalla versione dei dati: un client aggiornato
+        # riceve 304 senza query sui deal e senza serializzazione. Prima di costruire
+        # la risposta vale solo l'ETag, specifico dell'URL: Last-Modified è globale e
+        # darebbe 304 anche a un oggetto inesistente
+        etag = response_etag(request, scope, version.version)
+        last_modified = int(version.updated_at.timestamp())
+        not_modified = get_conditional_response(request._request, etag=etag)
+        if not_modified is not None:
+            return self._add_validators(not_modified, etag, last_modified)
+
+        cache = get_cache()
+        key = response_cache_key(request, scope, version.version)
+
+        # In cache finiscono solo risposte 200: da qui in poi If-Modified-Since è affidabile
+        data = cache.get(key)
+        if data is not None:
+            return self._conditional(request, Response(data), etag, last_modified)
+
+        response = build_response()
+        if response.status_code == status.HTTP_200_OK:
+            cache.set(key, response.data, timeout=self.get_cache_timeout(request))
+            return self._conditional(request, response, etag, last_modified)
+        return response
+
+    def _conditional(self, request, response, etag, last_modified):
+        response = get_conditional_response(
+            request._request, etag=etag, last_modified=last_modified, response=response
+        )
+        return self._add_validators(response, etag, last_modified)
+
+    def perform_create(self, serializer):
+        super().perform_create(serializer)
+        bump_generation()
+
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        bump_generation()
+
+    def perform_destroy(self, instance):
+        super().perform_destroy(instance)
+        bump_generation()
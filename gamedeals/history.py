@@ -0,0 +1,35 @@
+from typing import Dict, List, Optional
+
+from .models import DealsList, PricePoint
+
+
+def _lowest(points: List[PricePoint]) -> Optional[PricePoint]:
+    # A parità di prezzo vale la prima volta in cui è stato raggiunto
+    return min(points, key=lambda point: (point.sale_cents, point.recorded_at), default=None)
+
+
+def deal_price_history(deal: DealsList) -> Dict:
+    # Lettura limitata all'indice (deal, recorded_at): non si scandisce la storia degli altri deal
+    points = list(deal.price_history.order_by('recorded_at'))
+    return {
+        'deal': deal,
+        'points': points,
+        'lowest': _lowest(points),
+    }
+
+
+def game_price_history(game_name: str) -> Optional[Dict]:
+    deals = list(DealsList.objects.filter(game_name=game_name).select_related('store'))
+    if not deals:
+        return None
+
+    points = list(PricePoint.objects.filter(deal__in=deals).order_by('recorded_at', 'pk'))
+    by_id = {deal.pk: deal for deal in deals}
+    for point in points:
+        point.deal = by_id[point.deal_id]
+    return {
+        'game_name': game_name,
+        'deals': deals,
+        'points': points,
+        'lowest': _lowest(points),
+    }
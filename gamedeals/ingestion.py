@@ -0,0 +1,306 @@
+import hashlib
+import logging
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from decimal import Decimal, InvalidOperation
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import DealsList, PricePoint, StoreInfo, StoreSyncState
+from .ratelimit import RateLimiter
+from .services import DealListService
+from .stores import StoreRegistry
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 500
+DEAL_LINK_URL = "https://www.cheapshark.com/redirect?dealID={}"
+
+DEAL_UPDATE_FIELDS = [
+    'store',
+    'game_name',
+    'image_url',
+    'saving',
+    'sale_price',
+    'normal_price',
+    'deal_rating',
+    'release_date',
+    'rating_text',
+    'deal_link',
+    'fingerprint',
+    'last_change',
+    'last_seen_at',
+]
+
+# Campi che entrano nell'impronta: se non cambiano, la riga non viene riscritta
+FINGERPRINT_FIELDS = [
+    name for name in DEAL_UPDATE_FIELDS if name not in ('fingerprint', 'last_change', 'last_seen_at')
+]
+
+
+@dataclass
+class IngestStats:
+    created: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    pages: int = 0
+    last_change: int = 0
+    # True se la lettura si è fermata al limite di pagine prima di esaurire le modifiche
+    truncated: bool = False
+    # Secondi spesi per fase: fetch, normalize, write (e rate_limit_wait, compresa in fetch)
+    timings: Dict[str, float] = field(default_factory=dict)
+
+    @property
+    def processed(self) -> int:
+        return self.created + self.updated + self.unchanged
+
+    @property
+    def rows_written(self) -> int:
+        return self.created + self.updated
+
+    @contextmanager
+    def timed(self, phase: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[phase] = self.timings.get(phase, 0.0) + time.perf_counter() - start
+
+    def merge(self, other: 'IngestStats') -> 'IngestStats':
+        self.created += other.created
+        self.updated += other.updated
+        self.unchanged += other.unchanged
+        self.pages += other.pages
+        self.last_change = max(self.last_change, other.last_change)
+        self.truncated = self.truncated or other.truncated
+        for phase, seconds in other.timings.items():
+            self.timings[phase] = self.timings.get(phase, 0.0) + seconds
+        return self
+
+
+def get_batch_size() -> int:
+    return getattr(settings, 'DEALS_INGEST_BATCH_SIZE', DEFAULT_BATCH_SIZE)
+
+
+def _to_decimal(value, places: str = '0.01') -> Decimal:
+    try:
+        return Decimal(str(value)).quantize(Decimal(places))
+    except (InvalidOperation, TypeError, ValueError):
+        return Decimal(0).quantize(Decimal(places))
+
+
+def normalize_deal(game: Dict, store: Optional[StoreInfo] = None) -> Dict:
+    deal_id = game.get('dealID', '')
+    return {
+        'external_id': deal_id,
+        'canonical_id': DealsList.canonical_external_id(deal_id),
+        'store': store,
+        'game_name': game.get('title', 'Nome non disponibile'),
+        'image_url': game.get('thumb', ''),
+        'saving': _to_decimal(game.get('savings', 0)),
+        'sale_price': _to_decimal(game.get('salePrice', 0)),
+        'normal_price': _to_decimal(game.get('normalPrice', 0)),
+        'deal_rating': _to_decimal(game.get('dealRating', 0), places='0.1'),
+        'release_date': int(game.get('releaseDate', 0) or 0) or None,
+        'rating_text': game.get('steamRatingText', '') or '',
+        'deal_link': DEAL_LINK_URL.format(deal_id),
+        'last_change': int(game.get('lastChange', 0) or 0) or None,
+    }
+
+
+def deal_fingerprint(row: Dict) -> str:
+    values = []
+    for name in FINGERPRINT_FIELDS:
+        value = row.get(name)
+        if name == 'store':
+            value = value.store_id if value is not None else None
+        values.append(str(value))
+    return hashlib.sha1('\x1f'.join(values).encode()).hexdigest()
+
+
+def _chunked(rows: Iterable[Dict], size: int) -> Iterator[List[Dict]]:
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def to_cents(value) -> int:
+    return int((Decimal(value) * 100).quantize(Decimal('1')))
+
+
+def _record_price_changes(deals: List[DealsList], previous_prices: Dict, recorded_at) -> int:
+    # Si aggiunge un punto solo se il prezzo è cambiato: il volume cresce con le
+    # variazioni di prezzo, non con il numero di sincronizzazioni
+    moved = []
+    for deal in deals:
+        prices = (to_cents(deal.sale_price), to_cents(deal.normal_price))
+        if previous_prices.get(deal.external_id) != prices:
+            moved.append((deal, prices))
+    if not moved:
+        return 0
+
+    # Senza RETURNING (es. MySQL) l'upsert non restituisce le chiavi primarie
+    if any(deal.pk is None for deal, _ in moved):
+        ids = dict(DealsList.objects.filter(
+            external_id__in=[deal.external_id for deal, _ in moved]
+        ).values_list('external_id', 'pk'))
+        for deal, _ in moved:
+            deal.pk = ids[deal.external_id]
+
+    PricePoint.objects.bulk_create([
+        PricePoint(deal_id=deal.pk, recorded_at=recorded_at, sale_cents=sale_cents, normal_cents=normal_cents)
+        for deal, (sale_cents, normal_cents) in moved
+    ])
+    return len(moved)
+
+
+def _upsert_chunk(chunk: List[Dict]) -> IngestStats:
+    # Lo stesso dealID può comparire più volte nello stesso payload: vince l'ultimo,
+    # altrimenti l'upsert proverebbe ad aggiornare due volte la stessa riga.
+    rows = {row['external_id']: row for row in chunk if row.get('external_id')}
+    if not rows:
+        return IngestStats()
+
+    now = timezone.now()
+    for row in rows.values():
+        row['fingerprint'] = deal_fingerprint(row)
+        row['last_seen_at'] = now
+
+    existing = {}
+    existing_prices = {}
+    for external_id, fingerprint, sale_price, normal_price in DealsList.objects.filter(
+        external_id__in=list(rows)
+    ).values_list('external_id', 'fingerprint', 'sale_price', 'normal_price'):
+        existing[external_id] = fingerprint
+        existing_prices[external_id] = (to_cents(sale_price), to_cents(normal_price))
+    changed = [row for external_id, row in rows.items() if existing.get(external_id) != row['fingerprint']]
+    updated = sum(1 for row in changed if row['external_id'] in existing)
+
+    unchanged_ids = [external_id for external_id, row in rows.items() if existing.get(external_id) == row['fingerprint']]
+    if unchanged_ids:
+        # Le righe invariate non vengono riscritte, ma risultano comunque ancora presenti upstream
+        DealsList.objects.filter(external_id__in=unchanged_ids).update(last_seen_at=now)
+
+    if changed:
+        written = DealsList.objects.bulk_create(
+            [DealsList(**row) for row in changed],
+            update_conflicts=True,
+            unique_fields=['external_id'],
+            update_fields=DEAL_UPDATE_FIELDS,
+        )
+        _record_price_changes(written, existing_prices, now)
+
+    return IngestStats(
+        created=len(changed) - updated,
+        updated=updated,
+        unchanged=len(rows) - len(changed),
+        last_change=max((row['last_change'] or 0 for row in rows.values()), default=0),
+    )
+
+
+def bulk_upsert_deals(deals: Iterable[Dict], batch_size: Optional[int] = None) -> IngestStats:
+    batch_size = batch_size or get_batch_size()
+    stats = IngestStats()
+
+    for chunk in _chunked(deals, batch_size):
+        with transaction.atomic():
+            stats.merge(_upsert_chunk(chunk))
+
+    logger.info(
+        f"Upsert completato: {stats.created} creati, {stats.updated} aggiornati, "
+        f"{stats.unchanged} invariati"
+    )
+    return stats
+
+
+def ingest_pages(pages: Iterable[List[Dict]], store: Optional[StoreInfo] = None,
+                 batch_size: Optional[int] = None, stop_at_last_change: Optional[int] = None,
+                 progress: Optional[Callable[[IngestStats], None]] = None,
+                 max_pages: Optional[int] = None) -> IngestStats:
+    stats = IngestStats()
+    pages = iter(pages)
+    # Ogni pagina viene scritta appena arriva: in memoria c'è al più una pagina
+    while True:
+        page_stats = IngestStats()
+        waited_before = RateLimiter.thread_wait_seconds()
+        with page_stats.timed('fetch'):
+            page = next(pages, None)
+        # Parte della fase di fetch passata in attesa del rate limiter
+        waited = RateLimiter.thread_wait_seconds() - waited_before
+        if waited:
+            page_stats.timings['rate_limit_wait'] = waited
+        if page is None:
+            stats.merge(page_stats)
+            break
+        
+        with page_stats.timed('normalize'):
+            deals = [normalize_deal(game, store=store) for game in page]
+        with page_stats.timed('write'):
+            page_stats.merge(bulk_upsert_deals(deals, batch_size=batch_size))
+        page_stats.pages = 1
+        
+        stats.merge(page_stats)
+        if progress:
+            progress(page_stats)
+        
+        # Pagine ordinate per lastChange decrescente: oltre il high-water mark
+        # non ci sono più modifiche da scaricare
+        if stop_at_last_change is not None:
+            oldest_change = min(int(game.get('lastChange', 0) or 0) for game in page)
+            if oldest_change <= stop_at_last_change:
+                break
+        
+        if max_pages is not None and stats.pages >= max_pages:
+            stats.truncated = True
+            break
+    return stats
+
+
+def ingest_catalogue(store_ids: List[str], page_size: Optional[int] = None,
+                     max_pages: Optional[int] = None, incremental: bool = False,
+                     progress: Optional[Callable[[IngestStats], None]] = None) -> IngestStats:
+    stores = StoreRegistry()
+    stores.ensure(store_ids)
+    stats = IngestStats()
+    
+    for store_id in store_ids:
+        store = stores.get(store_id)
+        state = StoreSyncState.objects.filter(store=store).first() if store else None
+        high_water_mark = state.last_change if state else 0
+        
+        params = {}
+        if incremental:
+            params['sortBy'] = 'Recent'
+        # Il limite di pagine lo applica ingest_pages: così sa se la lettura è stata interrotta
+        pages = DealListService.iter_deal_pages(store_id=store_id, page_size=page_size, **params)
+        store_stats = ingest_pages(
+            pages,
+            store=store,
+            stop_at_last_change=high_water_mark if incremental else None,
+            progress=progress,
+            max_pages=max_pages,
+        )
+        
+        # Una lettura interrotta dal limite non ha visto le modifiche tra il vecchio
+        # high-water mark e l'ultima pagina letta: avanzarlo le salterebbe per sempre
+        if store_stats.truncated:
+            logger.warning(f"Store {store_id}: limite di {max_pages} pagine raggiunto, high-water mark invariato")
+        elif store and store_stats.last_change > high_water_mark:
+            StoreSyncState.objects.update_or_create(store=store, defaults={'last_change': store_stats.last_change})
+        
+        logger.info(
+            f"Store {store_id}: {store_stats.pages} pagine, "
+            f"{store_stats.created} creati, {store_stats.updated} aggiornati, {store_stats.unchanged} invariati"
+        )
+        stats.merge(store_stats)
+    
+    return stats
@@ -0,0 +1,214 @@
+import logging
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from typing import Optional
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.utils import timezone
+
+from .ingestion import IngestStats
+from .models import JobLock, SyncLog
+from .sync import SyncError, sync_deals
+
+logger = logging.getLogger(__name__)
+
+SYNC_LOCK_NAME = 'cheapshark-sync'
+ACTIVE_STATUSES = ('queued', 'running')
+
+_executor = None
+
+
+def get_executor() -> ThreadPoolExecutor:
+    # Un solo worker per processo: le sincronizzazioni sono comunque serializzate dal lock
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='gamedeals-sync')
+    return _executor
+
+
+def get_lock_ttl() -> int:
+    return getattr(settings, 'SYNC_LOCK_TTL', 600)
+
+
+def acquire_lock(name: str, ttl: Optional[int] = None, job_id: Optional[int] = None) -> Optional[str]:
+    ttl = ttl or get_lock_ttl()
+    owner = uuid.uuid4().hex
+    now = timezone.now()
+    expires_at = now + timedelta(seconds=ttl)
+
+    try:
+        with transaction.atomic():
+            JobLock.objects.create(name=name, owner=owner, job_id=job_id, expires_at=expires_at)
+        return owner
+    except IntegrityError:
+        # Lock scaduto (processo morto durante una sincronizzazione): lo si riprende
+        stolen = JobLock.objects.filter(name=name, expires_at__lt=now).update(
+            owner=owner, job_id=job_id, acquired_at=now, expires_at=expires_at
+        )
+        return owner if stolen else None
+
+
+def renew_lock(name: str, owner: str, ttl: Optional[int] = None, job_id: Optional[int] = None) -> bool:
+    """Sposta in avanti la scadenza di un lock ancora posseduto; False se è stato perso."""
+    ttl = ttl or get_lock_ttl()
+    changes = {'expires_at': timezone.now() + timedelta(seconds=ttl)}
+    if job_id is not None:
+        changes['job_id'] = job_id
+    return bool(JobLock.objects.filter(name=name, owner=owner).update(**changes))
+
+
+def release_lock(name: str, owner: str):
+    JobLock.objects.filter(name=name, owner=owner).delete()
+
+
+class SyncConflict(Exception):
+    """Richiesta una sincronizzazione mentre ne è in corso una diversa."""
+
+    def __init__(self, job: Optional[SyncLog]):
+        super().__init__("Un'altra sincronizzazione è già in corso")
+        self.job = job
+
+
+def active_sync_job() -> Optional[SyncLog]:
+    """
+    Job di sincronizzazione in corso. Un job è vivo solo finché tiene il lock: le righe
+    rimaste "queued"/"running" senza lock (worker riavviato a metà) vengono segnate come fallite.
+    """
+    now = timezone.now()
+    lock = JobLock.objects.filter(name=SYNC_LOCK_NAME, expires_at__gte=now).first()
+
+    orphaned = SyncLog.objects.filter(status__in=ACTIVE_STATUSES)
+    if lock is not None:
+        # Il lock si prende prima di creare la riga: quelle più recenti sono ancora in avvio
+        orphaned = orphaned.filter(created_at__lt=lock.acquired_at)
+        if lock.job_id is not None:
+            orphaned = orphaned.exclude(pk=lock.job_id)
+    reaped = orphaned.update(
+        status='failed', error_message="Job interrotto: il processo che lo eseguiva è terminato", finished_at=now
+    )
+    if reaped:
+        logger.warning(f"Segnate come fallite {reaped} sincronizzazioni orfane")
+
+    if lock is None or lock.job_id is None:
+        return None
+    return SyncLog.objects.filter(pk=lock.job_id, status__in=ACTIVE_STATUSES).first()
+
+
+class SyncProgress:
+    """Accumula le statistiche di ogni pagina e le riporta sulla riga SyncLog del job."""
+
+    def __init__(self, log: SyncLog, lock_owner: Optional[str] = None):
+        self.log = log
+        self.lock_owner = lock_owner
+        self.stats = IngestStats()
+
+    def apply(self, log: SyncLog):
+        log.pages_fetched = self.stats.pages
+        log.rows_written = self.stats.rows_written
+        log.deals_created = self.stats.created
+        log.deals_updated = self.stats.updated
+        log.deals_unchanged = self.stats.unchanged
+        log.phase_timings = {phase: round(seconds, 3) for phase, seconds in self.stats.timings.items()}
+
+    def __call__(self, page_stats: IngestStats):
+        self.stats.merge(page_stats)
+        self.apply(self.log)
+        # UPDATE mirato: lo stato resta consultabile mentre la sincronizzazione prosegue
+        SyncLog.objects.filter(pk=self.log.pk).update(
+            pages_fetched=self.log.pages_fetched,
+            rows_written=self.log.rows_written,
+            deals_created=self.log.deals_created,
+            deals_updated=self.log.deals_updated,
+            deals_unchanged=self.log.deals_unchanged,
+            phase_timings=self.log.phase_timings,
+        )
+        # Ogni pagina rinnova il lock: una sincronizzazione lunga non lo vede scadere
+        if self.lock_owner and not renew_lock(SYNC_LOCK_NAME, self.lock_owner):
+            raise SyncError("Lock della sincronizzazione perso: un altro processo l'ha ripreso")
+
+
+def run_sync_job(log_id: int, owner: Optional[str] = None) -> SyncLog:
+    log = SyncLog.objects.get(pk=log_id)
+    if owner is None:
+        owner = acquire_lock(SYNC_LOCK_NAME, job_id=log.pk)
+    elif not renew_lock(SYNC_LOCK_NAME, owner):
+        owner = None
+    if owner is None:
+        logger.warning(f"Sincronizzazione {log.pk} annullata: un'altra è già in corso")
+        log.status = 'failed'
+        log.error_message = "Un'altra sincronizzazione è già in corso"
+        log.finished_at = timezone.now()
+        log.save(update_fields=['status', 'error_message', 'finished_at'])
+        return log
+
+    progress = SyncProgress(log, lock_owner=owner)
+    try:
+        log.status = 'running'
+        log.started_at = timezone.now()
+        log.save(update_fields=['status', 'started_at'])
+        logger.info(f"Avvio sincronizzazione {log.pk} ({log.mode})")
+
+        log.result = sync_deals(log.mode, progress=progress)
+        log.status = 'success'
+    except SyncError as e:
+        log.status = 'failed'
+        log.error_message = e.message
+    except Exception as e:
+        logger.exception(f"Errore durante la sincronizzazione {log.pk}")
+        log.status = 'failed'
+        log.error_message = str(e)
+    finally:
+        progress.apply(log)
+        log.finished_at = timezone.now()
+        log.save()
+        release_lock(SYNC_LOCK_NAME, owner)
+
+    logger.info(f"Sincronizzazione {log.pk} terminata: {log.status}")
+    return log
+
+
+def _run_in_worker(log_id: int, owner: str):
+    close_old_connections()
+    try:
+        run_sync_job(log_id, owner)
+    finally:
+        close_old_connections()
+
+
+def _start_job(owner: str, mode: str, sync_type: str) -> SyncLog:
+    log = SyncLog.objects.create(sync_type=sync_type, status='queued', mode=mode)
+    renew_lock(SYNC_LOCK_NAME, owner, job_id=log.pk)
+    return log
+
+
+def enqueue_sync(mode: str = 'featured', sync_type: str = 'manual') -> SyncLog:
+    # Un job già in corso con la stessa modalità viene riusato; con un'altra è un conflitto
+    active = active_sync_job()
+    if active is not None:
+        if active.mode != mode:
+            raise SyncConflict(active)
+        return active
+
+    owner = acquire_lock(SYNC_LOCK_NAME)
+    if owner is None:
+        # Un altro processo ha appena avviato una sincronizzazione
+        raise SyncConflict(active_sync_job())
+    log = _start_job(owner, mode, sync_type)
+
+    if getattr(settings, 'SYNC_JOBS_EAGER', False):
+        return run_sync_job(log.pk, owner)
+
+    # Il worker deve vedere la riga appena creata: si parte solo dopo il commit
+    transaction.on_commit(lambda: get_executor().submit(_run_in_worker, log.pk, owner))
+    return log
+
+
+def run_sync_now(mode: str = 'full', sync_type: str = 'scheduled') -> SyncLog:
+    active_sync_job()
+    owner = acquire_lock(SYNC_LOCK_NAME)
+    if owner is None:
+        log = SyncLog.objects.create(sync_type=sync_type, status='queued', mode=mode)
+        return run_sync_job(log.pk)
+    return run_sync_job(_start_job(owner, mode, sync_type).pk, owner)
@@ -0,0 +1,113 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+
+from django.conf import settings
+
+from .models import DealsList
+from .services import DealListService, run_in_worker_thread
+
+logger = logging.getLogger(__name__)
+
+CACHE_HIT = 'HIT'
+CACHE_STALE = 'STALE'
+CACHE_MISS = 'MISS'
+
+
+class LiveDealService:
+    """
+    Dettaglio di un deal letto in diretta da CheapShark, con davanti una cache LRU
+    limitata e a breve scadenza:
+    - richieste concorrenti per lo stesso dealID condividono una sola chiamata (single-flight);
+    - oltre il TTL il dato viene ancora servito per una finestra "stale" mentre
+      un thread in background lo aggiorna;
+    - un miss con il rate limiter saturo solleva RateLimitExceeded invece di attendere.
+    """
+
+    _entries: 'OrderedDict[str, Tuple[float, Optional[Dict]]]' = OrderedDict()
+    _inflight: Dict[str, Future] = {}
+    _lock = threading.Lock()
+    _executor: Optional[ThreadPoolExecutor] = None
+
+    @staticmethod
+    def _setting(name: str, default):
+        return getattr(settings, name, default)
+
+    @classmethod
+    def get_executor(cls) -> ThreadPoolExecutor:
+        with cls._lock:
+            if cls._executor is None:
+                cls._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='gamedeals-live')
+            return cls._executor
+
+    @classmethod
+    def reset(cls):
+        with cls._lock:
+            cls._entries.clear()
+            cls._inflight.clear()
+
+    @classmethod
+    def _store(cls, key: str, data):
+        max_entries = cls._setting('LIVE_DEAL_CACHE_MAX_ENTRIES', 1000)
+        with cls._lock:
+            cls._entries[key] = (time.monotonic(), data)
+            cls._entries.move_to_end(key)
+            while len(cls._entries) > max_entries:
+                cls._entries.popitem(last=False)
+
+    @classmethod
+    def _load(cls, key: str, fail_fast: bool = False):
+        with cls._lock:
+            future = cls._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                cls._inflight[key] = future
+
+        if leader:
+            try:
+                data = DealListService.get_game_deals(key, fail_fast=fail_fast)
+                if data is not None:
+                    cls._store(key, data)
+                future.set_result(data)
+            except Exception as e:
+                future.set_exception(e)
+            finally:
+                with cls._lock:
+                    cls._inflight.pop(key, None)
+
+        return future.result()
+
+    @classmethod
+    def refresh_in_background(cls, key: str) -> Optional[Future]:
+        with cls._lock:
+            if key in cls._inflight:
+                return None
+        return cls.get_executor().submit(run_in_worker_thread, cls._load, key)
+
+    @classmethod
+    def get(cls, deal_id: str) -> Tuple[Optional[Dict], str]:
+        key = DealsList.canonical_external_id(deal_id)
+        ttl = cls._setting('LIVE_DEAL_CACHE_TTL', 60)
+        stale_ttl = cls._setting('LIVE_DEAL_CACHE_STALE_TTL', 600)
+
+        with cls._lock:
+            entry = cls._entries.get(key)
+            if entry is not None:
+                cls._entries.move_to_end(key)
+
+        if entry is not None:
+            fetched_at, data = entry
+            age = time.monotonic() - fetched_at
+            if age < ttl:
+                return data, CACHE_HIT
+            if age < ttl + stale_ttl:
+                cls.refresh_in_background(key)
+                return data, CACHE_STALE
+
+        logger.info(f"Dettaglio deal {key} non in cache: richiesta a CheapShark")
+        # Siamo nel thread della richiesta: se il rate limiter imporrebbe un'attesa lunga si fallisce subito
+        return cls._load(key, fail_fast=True), CACHE_MISS
@@ -0,0 +1,81 @@
+import logging
+from datetime import timedelta
+from typing import Optional
+
+from django.conf import settings
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .caching import bump_generation
+from .models import DealsList, StoreInfo, StoreSyncState, SyncLog
+from .search import search_index_suspended
+from .topdeals import rebuild_top_deals
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_STALE_TTL_DAYS = 30
+DEFAULT_CLEANUP_BATCH_SIZE = 1000
+
+
+def stale_deals_cutoff(ttl_days: Optional[int] = None):
+    ttl_days = ttl_days if ttl_days is not None else getattr(settings, 'DEALS_STALE_TTL_DAYS', DEFAULT_STALE_TTL_DAYS)
+    cutoff = timezone.now() - timedelta(days=ttl_days)
+
+    # Un deal non visto da più di ttl_days ma ancora riportato dall'ultima
+    # sincronizzazione completa non è stale: vale il più vecchio dei due limiti
+    last_full = SyncLog.objects.filter(
+        status='success', mode='full', started_at__isnull=False
+    ).order_by('-started_at').values_list('started_at', flat=True).first()
+    if last_full is not None:
+        cutoff = min(cutoff, last_full)
+    return cutoff
+
+
+def cleanup_stale_deals(ttl_days: Optional[int] = None, batch_size: Optional[int] = None) -> int:
+    """Elimina a blocchi i deal che l'API non riporta più da oltre ttl_days."""
+    batch_size = batch_size or getattr(settings, 'DEALS_CLEANUP_BATCH_SIZE', DEFAULT_CLEANUP_BATCH_SIZE)
+    cutoff = stale_deals_cutoff(ttl_days)
+    stale = DealsList.objects.filter(last_seen_at__lt=cutoff)
+
+    deleted = 0
+    while True:
+        # Una transazione breve per blocco: le letture non restano bloccate per tutta la pulizia
+        with transaction.atomic():
+            ids = list(stale.order_by('pk').values_list('pk', flat=True)[:batch_size])
+            if not ids:
+                break
+            count, _ = DealsList.objects.filter(pk__in=ids).delete()
+        deleted += len(ids)
+        logger.debug(f"Eliminato un blocco di {count} righe ({deleted} deals finora)")
+
+    if deleted:
+        rebuild_top_deals()
+        bump_generation()
+    return deleted
+
+
+def reset_deals(keep_stores: bool = False) -> int:
+    """
+    Svuota la tabella dei deal (e, se richiesto, quella degli store) con DELETE/TRUNCATE
+    diretti: niente collector di Django, quindi memoria costante anche su cataloghi enormi.
+    """
+    count = DealsList.objects.count()
+
+    # Senza deal anche i punti di ripresa della sincronizzazione incrementale vanno azzerati
+    models = [DealsList, StoreSyncState]
+    if not keep_stores:
+        models.append(StoreInfo)
+    tables = [model._meta.db_table for model in models]
+
+    # allow_cascade include le tabelle che referenziano quelle svuotate (TRUNCATE ... CASCADE su PostgreSQL)
+    statements = connection.ops.sql_flush(no_style(), tables, allow_cascade=True)
+    with transaction.atomic():
+        with search_index_suspended():
+            with connection.cursor() as cursor:
+                for statement in statements:
+                    cursor.execute(statement)
+
+    bump_generation()
+    logger.info(f"Reset dei deal completato: eliminati {count} deals" + (", store mantenuti" if keep_stores else ""))
+    return count
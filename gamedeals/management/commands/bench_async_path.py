@@ -0,0 +1,172 @@
+import asyncio
+import json
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+from django.test import AsyncClient, Client, override_settings
+from django.test.utils import setup_test_environment, teardown_test_environment
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from gamedeals.async_services import AsyncCheapSharkClient, AsyncDealListService
+from gamedeals.caching import get_cache
+from gamedeals.services import CheapSharkClient, DealListService
+
+from .bench_deals_queries import seed_deals
+
+
+class SlowUpstream:
+    """CheapShark finto che risponde dopo un ritardo fisso, per simulare un upstream lento."""
+
+    def __init__(self, delay):
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                time.sleep(delay)
+                payload = json.dumps([]).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        class Server(ThreadingHTTPServer):
+            # Con la coda di default (5) le connessioni in eccesso finirebbero in ritrasmissione SYN
+            request_queue_size = 1024
+            daemon_threads = True
+
+        self.server = Server(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/deals"
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class Command(BaseCommand):
+    help = (
+        "Confronta il percorso WSGI (viste DRF, client requests su thread) con quello ASGI "
+        "(viste asincrone, client httpx) a parità di richieste concorrenti"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--deals', type=int, default=20_000)
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--concurrency', type=int, default=50, help="Richieste in volo contemporaneamente")
+        parser.add_argument('--threads', type=int, default=8, help="Thread del worker WSGI simulato")
+        parser.add_argument('--upstream-delay', type=float, default=0.2, help="Latenza simulata di CheapShark (secondi)")
+
+    def handle(self, *args, **options):
+        # Database di test dedicato: il database reale non viene toccato
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            self.stdout.write(f"Popolamento di {options['deals']} deal...")
+            seed_deals(options['deals'])
+            user = User.objects.create_user(username='bench', password='bench')
+            token = str(RefreshToken.for_user(user).access_token)
+
+            self.stdout.write(self.style.MIGRATE_HEADING("\n== Lettura deal dal database =="))
+            paths = [f"?limit=8&offset={i * 8}&ordering=-deal_rating" for i in range(options['requests'])]
+            get_cache().clear()
+            self.report("WSGI /api/deals/", self.run_wsgi(
+                lambda client, query: client.get(f"/api/deals/{query}", HTTP_AUTHORIZATION=f"Bearer {token}"),
+                paths, options['threads'],
+            ))
+            get_cache().clear()
+            self.report("ASGI /api/async/deals/", asyncio.run(self.run_asgi(
+                lambda client, query: client.get(f"/api/async/deals/{query}", headers={'Authorization': f"Bearer {token}"}),
+                paths, options['concurrency'],
+            )))
+
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f"\n== Chiamate a CheapShark con {options['upstream_delay']}s di latenza =="
+            ))
+            self.run_upstream(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+    def run_upstream(self, options):
+        store_ids = [str(i) for i in range(options['requests'])]
+        pool_size = max(options['threads'], options['concurrency'])
+        with SlowUpstream(options['upstream_delay']) as upstream, \
+                mock.patch.object(DealListService, 'BASE_URL', upstream.url), \
+                override_settings(CHEAPSHARK_POOL_MAXSIZE=pool_size, CHEAPSHARK_RATE_LIMIT=None):
+            # Si misura il client, non il rate limiter condiviso
+            CheapSharkClient.close()
+            self.report("WSGI requests su thread", self.run_wsgi(
+                lambda client, store_id: DealListService.fetch_games(store_id=store_id),
+                store_ids, options['threads'],
+            ))
+            CheapSharkClient.close()
+
+            async def fetch_all():
+                try:
+                    return await self.run_asgi(
+                        lambda client, store_id: AsyncDealListService.fetch_games(store_id=store_id),
+                        store_ids, options['concurrency'],
+                    )
+                finally:
+                    await AsyncCheapSharkClient.aclose()
+
+            self.report("ASGI httpx asincrono", asyncio.run(fetch_all()))
+
+    def run_wsgi(self, call, items, threads):
+        # Un worker WSGI serve una richiesta per thread: la concorrenza è limitata da --threads
+        local = threading.local()
+
+        def timed(item):
+            if not hasattr(local, 'client'):
+                local.client = Client()
+            start = time.perf_counter()
+            try:
+                result = call(local.client, item)
+            finally:
+                close_old_connections()
+            return time.perf_counter() - start, getattr(result, 'status_code', 200)
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            latencies = list(executor.map(timed, items))
+        return time.perf_counter() - start, latencies
+
+    async def run_asgi(self, call, items, concurrency):
+        # Un solo event loop: le richieste in attesa non occupano un thread
+        client = AsyncClient()
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def timed(item):
+            async with semaphore:
+                start = time.perf_counter()
+                result = await call(client, item)
+                return time.perf_counter() - start, getattr(result, 'status_code', 200)
+
+        start = time.perf_counter()
+        latencies = await asyncio.gather(*(timed(item) for item in items))
+        return time.perf_counter() - start, latencies
+
+    def report(self, label, result):
+        elapsed, samples = result
+        latencies = sorted(latency for latency, _ in samples)
+        errors = sum(1 for _, status_code in samples if status_code >= 400)
+        p95 = latencies[max(0, int(len(latencies) * 0.95) - 1)]
+        self.stdout.write(self.style.SUCCESS(
+            f"{label}: {len(latencies) / elapsed:.1f} req/s, "
+            f"p50 {statistics.median(latencies) * 1000:.1f} ms, p95 {p95 * 1000:.1f} ms, "
+            f"totale {elapsed:.2f} s, errori {errors}"
+        ))
@@ -0,0 +1,107 @@
+import random
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.http import QueryDict
+
+from gamedeals.models import DealsList, StoreInfo
+from gamedeals.views import DealsFilter
+
+# Combinazioni filtro/ordinamento che il frontend usa su /api/deals/
+SCENARIOS = [
+    ('prezzo <= 5', 'sale_price__lte=5', None),
+    ('rating >= 9', 'deal_rating__gte=9', None),
+    ('store esatto', 'store__store_name=Steam', None),
+    ('store + prezzo', 'store__store_name=Steam&sale_price__lte=5', None),
+    ('store + ordina rating', 'store__store_name=GOG', '-deal_rating'),
+    ('ordina prezzo', '', 'sale_price'),
+    ('ordina saving', '', '-saving'),
+    ('ordina nome', '', 'game_name'),
+]
+
+
+def seed_deals(total):
+    stores = [
+        StoreInfo.objects.create(store_id=store_id, store_name=name)
+        for store_id, name in (('1', 'Steam'), ('7', 'Humble Bundle'), ('25', 'GOG'))
+    ]
+    rng = random.Random(42)
+    batch = []
+    for i in range(total):
+        normal_price = Decimal(rng.randint(199, 6999)) / 100
+        sale_price = (normal_price * Decimal(rng.randint(5, 100)) / 100).quantize(Decimal('0.01'))
+        batch.append(DealsList(
+            external_id=f"bench-{i}",
+            canonical_id=f"bench-{i}",
+            store=stores[i % len(stores)],
+            game_name=f"Game {rng.randint(0, total)}",
+            image_url='https://example.com/thumb.jpg',
+            saving=(100 - sale_price / normal_price * 100).quantize(Decimal('0.01')),
+            sale_price=sale_price,
+            normal_price=normal_price,
+            deal_rating=round(rng.uniform(0, 10), 1),
+            release_date=0,
+        ))
+        if len(batch) >= 5000:
+            DealsList.objects.bulk_create(batch)
+            batch = []
+    DealsList.objects.bulk_create(batch)
+    if connection.vendor in ('sqlite', 'postgresql'):
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+
+class Command(BaseCommand):
+    help = "Misura piani di esecuzione e tempi delle query di /api/deals/ su un database di test popolato"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--deals', type=int, default=100_000)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--limit', type=int, default=8)
+        parser.add_argument('--compare', action='store_true', help="Ripete le misure dopo aver rimosso gli indici")
+
+    def handle(self, *args, **options):
+        # Database di test dedicato: il database reale non viene toccato
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            self.seed(options['deals'])
+            self.run_scenarios(options['repeat'], options['limit'], "con indici")
+            if options['compare']:
+                self.drop_indexes()
+                self.run_scenarios(options['repeat'], options['limit'], "senza indici")
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def seed(self, total):
+        self.stdout.write(f"Popolamento di {total} deal...")
+        seed_deals(total)
+
+    def drop_indexes(self):
+        with connection.schema_editor() as schema_editor:
+            for index in DealsList._meta.indexes:
+                schema_editor.remove_index(DealsList, index)
+
+    def build_queryset(self, query, ordering):
+        queryset = DealsFilter(QueryDict(query), queryset=DealsList.objects.select_related('store')).qs
+        if ordering:
+            queryset = queryset.order_by(ordering)
+        return queryset
+
+    def run_scenarios(self, repeat, limit, label):
+        self.stdout.write(self.style.MIGRATE_HEADING(f"\n== {label} =="))
+        for name, query, ordering in SCENARIOS:
+            queryset = self.build_queryset(query, ordering)
+            page = queryset[:limit]
+
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                queryset.count()
+                list(page)
+                timings.append((time.perf_counter() - start) * 1000)
+
+            self.stdout.write(self.style.SUCCESS(f"\n{name}: min {min(timings):.2f} ms, media {sum(timings) / len(timings):.2f} ms"))
+            for line in page.explain().splitlines():
+                self.stdout.write(f"    {line}")
@@ -0,0 +1,38 @@
+# Generated by Django 5.1.15 on 2026-10-18 07:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gamedeals', '0016_dealslist_deal_link'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dealslist',
+            name='fingerprint',
+            field=models.CharField(blank=True, max_length=40),
+        ),
+        migrations.AddField(
+            model_name='dealslist',
+            name='last_change',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='synclog',
+            name='deals_unchanged',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='StoreSyncState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_change', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('store', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='sync_state', to='gamedeals.storeinfo')),
+            ],
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.1.15 on 2026-10-18 07:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gamedeals', '0017_incremental_sync'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='storeinfo',
+            name='store_name',
+            field=models.CharField(db_index=True, max_length=100),
+        ),
+        migrations.AddIndex(
+            model_name='dealslist',
+            index=models.Index(fields=['sale_price'], name='deals_sale_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dealslist',
+            index=models.Index(fields=['deal_rating'], name='deals_deal_rating_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dealslist',
+            index=models.Index(fields=['saving'], name='deals_saving_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dealslist',
+            index=models.Index(fields=['game_name'], name='deals_game_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dealslist',
+            index=models.Index(fields=['store', 'sale_price'], name='deals_store_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dealslist',
+            index=models.Index(fields=['store', 'deal_rating'], name='deals_store_rating_idx'),
+        ),
+    ]
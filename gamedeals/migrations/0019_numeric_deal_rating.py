@@ -0,0 +1,51 @@
+# Generated by Django 5.1.15 on 2026-10-18 07:31
+
+from decimal import Decimal, InvalidOperation
+
+from django.db import migrations, models
+
+
+def clean_deal_ratings(apps, schema_editor):
+    # Il campo era un CharField: i valori non numerici diventano 0 prima del cambio di tipo
+    DealsList = apps.get_model('gamedeals', 'DealsList')
+    for deal in DealsList.objects.only('id', 'deal_rating').iterator():
+        try:
+            rating = Decimal(str(deal.deal_rating).strip()).quantize(Decimal('0.1'))
+            if not rating.is_finite() or abs(rating) >= 1000:
+                raise InvalidOperation
+        except (InvalidOperation, ValueError):
+            rating = Decimal('0.0')
+        if str(rating) != deal.deal_rating:
+            DealsList.objects.filter(pk=deal.pk).update(deal_rating=str(rating))
+
+
+def clear_missing_release_dates(apps, schema_editor):
+    DealsList = apps.get_model('gamedeals', 'DealsList')
+    DealsList.objects.filter(release_date__lte=0).update(release_date=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gamedeals', '0018_deal_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(clean_deal_ratings, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='dealslist',
+            name='deal_rating',
+            field=models.DecimalField(blank=True, decimal_places=1, default=0, max_digits=4),
+        ),
+        migrations.AlterField(
+            model_name='dealslist',
+            name='release_date',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='dealslist',
+            name='saving',
+            field=models.DecimalField(blank=True, decimal_places=2, default=0, max_digits=6),
+        ),
+        migrations.RunPython(clear_missing_release_dates, migrations.RunPython.noop),
+    ]
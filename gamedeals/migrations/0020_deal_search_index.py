@@ -0,0 +1,68 @@
+import logging
+
+from django.db import DatabaseError, migrations, transaction
+
+logger = logging.getLogger(__name__)
+
+# SQL copiato qui e non importato da gamedeals.search: una migrazione storica
+# deve fare sempre la stessa cosa, anche se il modulo cambia in seguito
+DEALS_TABLE = 'gamedeals_dealslist'
+FTS_TABLE = 'gamedeals_dealslist_fts'
+
+SQLITE_FTS_SQL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        game_name, content='{DEALS_TABLE}', content_rowid='id', tokenize='trigram'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON {DEALS_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, game_name) VALUES (new.id, new.game_name);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON {DEALS_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, game_name) VALUES ('delete', old.id, old.game_name);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF game_name ON {DEALS_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, game_name) VALUES ('delete', old.id, old.game_name);
+        INSERT INTO {FTS_TABLE}(rowid, game_name) VALUES (new.id, new.game_name);
+    END""",
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+]
+
+POSTGRES_TRGM_SQL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    f"""CREATE INDEX IF NOT EXISTS deals_game_name_trgm_idx
+        ON {DEALS_TABLE} USING gin (UPPER(game_name::text) gin_trgm_ops)""",
+]
+
+
+def install_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    statements = {'sqlite': SQLITE_FTS_SQL, 'postgresql': POSTGRES_TRGM_SQL}.get(connection.vendor, [])
+    try:
+        # Savepoint: un errore (estensione non permessa, FTS5 assente) non deve
+        # abortire la transazione della migrazione
+        with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
+    except DatabaseError as e:
+        # La ricerca ricade su icontains
+        logger.warning(f"Indice di ricerca non disponibile: {e}")
+
+
+def drop_search_index(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        if schema_editor.connection.vendor == 'sqlite':
+            for suffix in ('ai', 'ad', 'au'):
+                cursor.execute(f"DROP TRIGGER IF EXISTS {FTS_TABLE}_{suffix}")
+            cursor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+        elif schema_editor.connection.vendor == 'postgresql':
+            cursor.execute("DROP INDEX IF EXISTS deals_game_name_trgm_idx")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gamedeals', '0019_numeric_deal_rating'),
+    ]
+
+    operations = [
+        migrations.RunPython(install_search_index, drop_search_index),
+    ]
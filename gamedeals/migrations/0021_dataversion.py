@@ -0,0 +1,28 @@
+# Generated by Django 5.1.15 on 2026-10-18 07:34
+
+from django.db import migrations, models
+
+
+def create_catalogue_version(apps, schema_editor):
+    DataVersion = apps.get_model('gamedeals', 'DataVersion')
+    DataVersion.objects.get_or_create(name='catalogue')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gamedeals', '0020_deal_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DataVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('version', models.PositiveIntegerField(default=1)),
+                ('updated_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.RunPython(create_catalogue_version, migrations.RunPython.noop),
+    ]
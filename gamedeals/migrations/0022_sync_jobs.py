@@ -0,0 +1,48 @@
+# Generated by Django 5.1.15 on 2026-10-18 07:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gamedeals', '0021_dataversion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JobLock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('owner', models.CharField(max_length=32)),
+                ('acquired_at', models.DateTimeField(auto_now=True)),
+                ('expires_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='synclog',
+            name='finished_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='synclog',
+            name='mode',
+            field=models.CharField(blank=True, max_length=20),
+        ),
+        migrations.AddField(
+            model_name='synclog',
+            name='result',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='synclog',
+            name='started_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='synclog',
+            name='status',
+            field=models.CharField(choices=[('queued', 'In coda'), ('running', 'In corso'), ('success', 'Successo'), ('failed', 'Fallita'), ('partial', 'Parziale')], max_length=20),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.1.15 on 2026-10-18 07:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gamedeals', '0022_sync_jobs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='synclog',
+            name='pages_fetched',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='synclog',
+            name='phase_timings',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='synclog',
+            name='rows_written',
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.1.15 on 2026-10-18 07:39
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gamedeals', '0023_synclog_progress'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dealslist',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='dealslist',
+            name='last_seen_at',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now),
+        ),
+    ]
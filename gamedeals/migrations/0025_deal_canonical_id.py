@@ -0,0 +1,43 @@
+# Generated by Django 5.1.15 on 2026-10-18 07:42
+
+from urllib.parse import unquote
+
+from django.db import migrations, models
+
+
+def canonical_external_id(value):
+    for _ in range(3):
+        decoded = unquote(value)
+        if decoded == value:
+            break
+        value = decoded
+    return value
+
+
+def fill_canonical_ids(apps, schema_editor):
+    DealsList = apps.get_model('gamedeals', 'DealsList')
+    batch = []
+    for deal in DealsList.objects.only('id', 'external_id').iterator(chunk_size=1000):
+        deal.canonical_id = canonical_external_id(deal.external_id)
+        batch.append(deal)
+        if len(batch) >= 1000:
+            DealsList.objects.bulk_update(batch, ['canonical_id'])
+            batch = []
+    if batch:
+        DealsList.objects.bulk_update(batch, ['canonical_id'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gamedeals', '0024_deal_timestamps'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dealslist',
+            name='canonical_id',
+            field=models.CharField(blank=True, db_index=True, max_length=100),
+        ),
+        migrations.RunPython(fill_canonical_ids, migrations.RunPython.noop),
+    ]
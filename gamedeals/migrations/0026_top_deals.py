@@ -0,0 +1,26 @@
+# Generated by Django 5.1.15 on 2026-10-18 07:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gamedeals', '0025_deal_canonical_id'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TopDeal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('deal', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='gamedeals.dealslist')),
+                ('store', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='top_deals', to='gamedeals.storeinfo')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('store', 'rank'), name='top_deal_store_rank_uniq')],
+            },
+        ),
+    ]
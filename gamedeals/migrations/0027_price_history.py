@@ -0,0 +1,49 @@
+# Generated by Django 5.1.15 on 2026-10-18 07:45
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def seed_price_history(apps, schema_editor):
+    # Un primo punto per i deal già presenti: la storia parte dal prezzo attuale
+    DealsList = apps.get_model('gamedeals', 'DealsList')
+    PricePoint = apps.get_model('gamedeals', 'PricePoint')
+    batch = []
+    deals = DealsList.objects.only('id', 'sale_price', 'normal_price', 'last_seen_at')
+    for deal in deals.iterator(chunk_size=1000):
+        batch.append(PricePoint(
+            deal_id=deal.id,
+            recorded_at=deal.last_seen_at,
+            sale_cents=int(round(deal.sale_price * 100)),
+            normal_cents=int(round(deal.normal_price * 100)),
+        ))
+        if len(batch) >= 1000:
+            PricePoint.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        PricePoint.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gamedeals', '0026_top_deals'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PricePoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('recorded_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('sale_cents', models.PositiveIntegerField()),
+                ('normal_cents', models.PositiveIntegerField()),
+                ('deal', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='price_history', to='gamedeals.dealslist')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['deal', 'recorded_at'], name='price_point_deal_time_idx')],
+            },
+        ),
+        migrations.RunPython(seed_price_history, migrations.RunPython.noop),
+    ]
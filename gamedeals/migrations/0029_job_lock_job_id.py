@@ -0,0 +1,18 @@
+# Generated by Django 5.1.15 on 2026-10-18 08:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gamedeals', '0028_rate_limit_bucket'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='joblock',
+            name='job_id',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -1,19 +1,53 @@
+from urllib.parse import unquote
+
 from django.db import models
+from django.utils import timezone
 
 class DealsList(models.Model):
     external_id = models.CharField(max_length=100, unique=True)
+    # dealID decodificato: il frontend lo invia sia in chiaro sia URL-encoded
+    canonical_id = models.CharField(max_length=100, db_index=True, blank=True)
     store = models.ForeignKey('StoreInfo', on_delete=models.CASCADE, null=True)  
     game_name = models.CharField(max_length=200)
     image_url = models.URLField(max_length=500)
-    saving = models.DecimalField(max_digits=6, decimal_places=2, blank=True)
+    saving = models.DecimalField(max_digits=6, decimal_places=2, blank=True, default=0)
     sale_price = models.DecimalField(max_digits=6, decimal_places=2)
     normal_price = models.DecimalField(max_digits=6, decimal_places=2)
-    deal_rating = models.CharField(max_length=50, blank=True)
-    release_date = models.IntegerField(blank=True)
+    deal_rating = models.DecimalField(max_digits=4, decimal_places=1, blank=True, default=0)
+    release_date = models.IntegerField(blank=True, null=True)
     rating_text = models.CharField(max_length=50, blank=True, null=True)
     deal_link = models.CharField(max_length=300, blank=True, null=True)
+    fingerprint = models.CharField(max_length=40, blank=True)
+    last_change = models.IntegerField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    last_seen_at = models.DateTimeField(default=timezone.now, db_index=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['sale_price'], name='deals_sale_price_idx'),
+            models.Index(fields=['deal_rating'], name='deals_deal_rating_idx'),
+            models.Index(fields=['saving'], name='deals_saving_idx'),
+            models.Index(fields=['game_name'], name='deals_game_name_idx'),
+            models.Index(fields=['store', 'sale_price'], name='deals_store_price_idx'),
+            models.Index(fields=['store', 'deal_rating'], name='deals_store_rating_idx'),
+        ]
+    
     def __str__(self):
         return self.game_name
+
+    @staticmethod
+    def canonical_external_id(value: str) -> str:
+        # Decodifica ripetuta: gestisce anche gli id codificati due volte
+        for _ in range(3):
+            decoded = unquote(value)
+            if decoded == value:
+                break
+            value = decoded
+        return value
+
+    def save(self, *args, **kwargs):
+        self.canonical_id = self.canonical_external_id(self.external_id)
+        super().save(*args, **kwargs)
     
 class GameDetails(models.Model):
     game_name = models.CharField(max_length=200)
@@ -24,7 +58,7 @@ class GameDetails(models.Model):
     
 class StoreInfo(models.Model):
     store_id = models.CharField(max_length=10, unique=True)
-    store_name = models.CharField(max_length=100)
+    store_name = models.CharField(max_length=100, db_index=True)
     store_logo_url = models.URLField(max_length=500, blank=True)
     store_banner_url = models.URLField(max_length=500, blank=True)
     store_icon_url = models.URLField(max_length=500, blank=True)
@@ -39,6 +73,8 @@ class SyncLog(models.Model):
     ]
     
     STATUS_CHOICES = [
+        ('queued', 'In coda'),
+        ('running', 'In corso'),
         ('success', 'Successo'),
         ('failed', 'Fallita'),
         ('partial', 'Parziale'),
@@ -46,10 +82,18 @@ class SyncLog(models.Model):
     
     sync_type = models.CharField(max_length=20, choices=SYNC_TYPES)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES)
+    mode = models.CharField(max_length=20, blank=True)
     deals_created = models.IntegerField(default=0)
     deals_updated = models.IntegerField(default=0)
+    deals_unchanged = models.IntegerField(default=0)
+    pages_fetched = models.IntegerField(default=0)
+    rows_written = models.IntegerField(default=0)
+    phase_timings = models.JSONField(default=dict, blank=True)
     error_message = models.TextField(blank=True)
+    result = models.JSONField(default=dict, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
     
     class Meta:
         ordering = ['-created_at']
@@ -57,6 +101,71 @@ class SyncLog(models.Model):
     def __str__(self):
         return f"{self.sync_type} - {self.status} - {self.created_at}"
 
+class JobLock(models.Model):
+    name = models.CharField(max_length=50, unique=True)
+    owner = models.CharField(max_length=32)
+    job_id = models.PositiveIntegerField(null=True, blank=True)
+    acquired_at = models.DateTimeField(auto_now=True)
+    expires_at = models.DateTimeField()
+    
+    def __str__(self):
+        return f"{self.name} ({self.owner})"
+
+class DataVersion(models.Model):
+    name = models.CharField(max_length=50, unique=True)
+    version = models.PositiveIntegerField(default=1)
+    updated_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"{self.name} v{self.version}"
+
+class StoreSyncState(models.Model):
+    store = models.OneToOneField('StoreInfo', on_delete=models.CASCADE, related_name='sync_state')
+    last_change = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.store} - {self.last_change}"
+
   
 
     
+
+class TopDeal(models.Model):
+    # Tabella materializzata: i migliori deal di ogni store, ricostruita a fine sincronizzazione
+    store = models.ForeignKey('StoreInfo', on_delete=models.CASCADE, related_name='top_deals')
+    deal = models.ForeignKey('DealsList', on_delete=models.CASCADE, related_name='+')
+    rank = models.PositiveSmallIntegerField()
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['store', 'rank'], name='top_deal_store_rank_uniq'),
+        ]
+    
+    def __str__(self):
+        return f"{self.store_id} #{self.rank}"
+
+class PricePoint(models.Model):
+    # Una riga solo quando il prezzo cambia; importi in centesimi interi
+    deal = models.ForeignKey('DealsList', on_delete=models.CASCADE, related_name='price_history')
+    recorded_at = models.DateTimeField(default=timezone.now)
+    sale_cents = models.PositiveIntegerField()
+    normal_cents = models.PositiveIntegerField()
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['deal', 'recorded_at'], name='price_point_deal_time_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.deal_id} @ {self.recorded_at}: {self.sale_cents}"
+
+class RateLimitBucket(models.Model):
+    # Token bucket condiviso tra processi: aggiornato con compare-and-swap su version
+    name = models.CharField(max_length=50, unique=True)
+    tokens = models.FloatField()
+    updated_at = models.FloatField()
+    version = models.PositiveBigIntegerField(default=0)
+    
+    def __str__(self):
+        return f"{self.name}: {self.tokens:.2f}"
@@ -0,0 +1,156 @@
+import base64
+import json
+from decimal import Decimal, InvalidOperation
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import BasePagination, LimitOffsetPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class DealsKeysetPagination(BasePagination):
+    """
+    Paginazione a cursore (keyset) sui campi di ordinamento consentiti, con l'id
+    come spareggio: ogni pagina è una ricerca sull'indice, quindi la pagina N
+    costa quanto la prima. Il conteggio totale è opzionale.
+    """
+    cursor_query_param = 'cursor'
+    mode_query_param = 'pagination'
+    limit_query_param = 'limit'
+    count_query_param = 'count'
+    default_limit = 8
+    max_limit = 100
+    approximate_count_cap = 10000
+    search_query_param = 'search'
+    invalid_cursor_message = 'Cursore non valido.'
+    ranked_search_message = (
+        "La paginazione a cursore non conserva l'ordinamento per rilevanza della ricerca: "
+        "indicare un parametro ordering oppure usare limit/offset."
+    )
+
+    @classmethod
+    def is_requested(cls, request) -> bool:
+        return cls.is_requested_by(request.query_params)
+
+    @classmethod
+    def is_requested_by(cls, query_params) -> bool:
+        return query_params.get(cls.mode_query_param) == 'cursor' or cls.cursor_query_param in query_params
+
+    def get_limit(self, request) -> int:
+        try:
+            limit = int(request.query_params[self.limit_query_param])
+        except (KeyError, ValueError):
+            return self.default_limit
+        return max(1, min(limit, self.max_limit))
+
+    def get_ordering(self, request, view):
+        allowed = getattr(view, 'ordering_fields', None) or []
+        ordering = request.query_params.get('ordering', '').split(',')[0].strip()
+        field = ordering.lstrip('-')
+        if field in allowed:
+            return field, ordering.startswith('-')
+        return 'pk', False
+
+    def encode_cursor(self, value, pk, reverse) -> str:
+        if isinstance(value, Decimal):
+            value = str(value)
+        # Il campo di ordinamento entra nel cursore: riusato con un altro ordering non è valido
+        payload = json.dumps({'f': self.field, 'v': value, 'id': pk, 'r': reverse}, separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode()).decode()
+
+    def decode_cursor(self, encoded, model):
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode()).decode())
+            if payload['f'] != self.field:
+                raise NotFound(self.invalid_cursor_message)
+            value = payload['v']
+            if self.field != 'pk':
+                # Il valore arriva dal client: va convertito come farebbe il campo del modello
+                value = model._meta.get_field(self.field).to_python(value)
+                if value is None:
+                    raise NotFound(self.invalid_cursor_message)
+            return value, int(payload['id']), bool(payload.get('r', False))
+        except (ValueError, KeyError, TypeError, InvalidOperation, DjangoValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_count(self, queryset, mode):
+        if mode == 'exact':
+            return queryset.count(), False
+        if mode == 'approx':
+            # COUNT su una subquery limitata: costo fisso anche su tabelle enormi
+            cap = self.approximate_count_cap
+            count = queryset.order_by()[:cap].count()
+            return count, count >= cap
+        return None, False
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.limit = self.get_limit(request)
+        self.field, descending = self.get_ordering(request, view)
+        if self.field == 'pk' and request.query_params.get(self.search_query_param, '').strip():
+            # Il cursore riordina per (campo, id): senza ordering i risultati perderebbero il ranking
+            raise ValidationError({self.mode_query_param: [self.ranked_search_message]})
+        self.count, self.count_is_approximate = self.get_count(
+            queryset, request.query_params.get(self.count_query_param, 'none')
+        )
+
+        reverse = False
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded:
+            value, pk, reverse = self.decode_cursor(encoded, queryset.model)
+            # Per la pagina precedente si scorre all'indietro e poi si ribalta il risultato
+            backwards = descending != reverse
+            if self.field == 'pk':
+                condition = Q(pk__lt=pk) if backwards else Q(pk__gt=pk)
+            else:
+                lookup = 'lt' if backwards else 'gt'
+                condition = Q(**{f"{self.field}__{lookup}": value}) | Q(**{self.field: value, f"pk__{lookup}": pk})
+            queryset = queryset.filter(condition)
+
+        backwards = descending != reverse
+        prefix = '-' if backwards else ''
+        order = [f"{prefix}{self.field}"] if self.field == 'pk' else [f"{prefix}{self.field}", f"{prefix}pk"]
+        rows = list(queryset.order_by(*order)[:self.limit + 1])
+
+        has_more = len(rows) > self.limit
+        rows = rows[:self.limit]
+        if reverse:
+            rows.reverse()
+
+        self.has_next = has_more if not reverse else bool(encoded)
+        self.has_previous = bool(encoded) if not reverse else has_more
+        self.page = rows
+        return rows
+
+    def _cursor_url(self, obj, reverse):
+        url = self.request.build_absolute_uri()
+        value = obj.pk if self.field == 'pk' else getattr(obj, self.field)
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(value, obj.pk, reverse))
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self._cursor_url(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self._cursor_url(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        payload = {}
+        if self.count is not None:
+            payload['count'] = self.count
+            payload['count_is_approximate'] = self.count_is_approximate
+        payload.update({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+        return Response(payload)
+
+
+class SyncLogPagination(LimitOffsetPagination):
+    default_limit = 20
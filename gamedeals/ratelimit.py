@@ -0,0 +1,149 @@
+import logging
+import threading
+import time
+from typing import Dict, Optional
+
+from django.conf import settings
+from django.db import Error, IntegrityError, transaction
+from django.db.models import F
+
+from .models import RateLimitBucket
+
+logger = logging.getLogger(__name__)
+
+CHEAPSHARK_BUCKET = 'cheapshark'
+MAX_CAS_ATTEMPTS = 10
+SLOW_WAIT_SECONDS = 1.0
+
+
+class RateLimitExceeded(Exception):
+    """Il token sarebbe disponibile solo oltre l'attesa massima concessa al chiamante."""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Limite di richieste a CheapShark raggiunto, riprovare tra {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+class RateLimiter:
+    """
+    Token bucket sulle chiamate a CheapShark, condiviso da worker e cron attraverso
+    il database. Ogni chiamata prenota un token con un UPDATE condizionato sulla
+    versione della riga; se il bucket è vuoto il token viene preso "a credito" e
+    il chiamante attende il tempo necessario a maturarlo.
+    Il credito è limitato da max_wait: oltre quella soglia il token non viene prenotato
+    e si solleva RateLimitExceeded, così nessun chiamante attende più di max_wait.
+    """
+
+    _local = threading.local()
+    _metrics_lock = threading.Lock()
+    _metrics = {'calls': 0, 'waits': 0, 'rejected': 0, 'wait_seconds': 0.0, 'max_wait_seconds': 0.0}
+
+    @staticmethod
+    def _setting(name: str, default):
+        return getattr(settings, name, default)
+
+    @classmethod
+    def get_max_wait(cls) -> float:
+        return cls._setting('CHEAPSHARK_RATE_MAX_WAIT', 30.0)
+
+    @classmethod
+    def reserve(cls, name: str = CHEAPSHARK_BUCKET, max_wait: Optional[float] = None) -> float:
+        """Prenota un token e restituisce i secondi da attendere prima della chiamata."""
+        rate = cls._setting('CHEAPSHARK_RATE_LIMIT', None)
+        if not rate:
+            return 0.0
+        capacity = cls._setting('CHEAPSHARK_RATE_BURST', 1)
+
+        for _ in range(MAX_CAS_ATTEMPTS):
+            now = time.time()
+            bucket = RateLimitBucket.objects.filter(name=name).values_list('tokens', 'updated_at', 'version').first()
+            if bucket is None:
+                try:
+                    with transaction.atomic():
+                        RateLimitBucket.objects.create(name=name, tokens=capacity - 1, updated_at=now)
+                    return 0.0
+                except IntegrityError:
+                    continue
+
+            tokens, updated_at, version = bucket
+            tokens = min(capacity, tokens + max(0.0, now - updated_at) * rate) - 1
+            wait = 0.0 if tokens >= 0 else -tokens / rate
+            if max_wait is not None and wait > max_wait:
+                # Nessuna prenotazione: il debito del bucket resta entro max_wait
+                raise RateLimitExceeded(wait - max_wait)
+
+            updated = RateLimitBucket.objects.filter(name=name, version=version).update(
+                tokens=tokens, updated_at=now, version=F('version') + 1
+            )
+            if updated:
+                return wait
+
+        # Contesa molto alta: si rispetta comunque il ritmo medio senza prenotare
+        logger.warning(f"Rate limiter {name}: prenotazione non riuscita dopo {MAX_CAS_ATTEMPTS} tentativi")
+        return 1.0 / rate
+
+    @classmethod
+    def acquire(cls, name: str = CHEAPSHARK_BUCKET, max_wait: Optional[float] = None) -> float:
+        max_wait = cls.get_max_wait() if max_wait is None else max_wait
+        try:
+            wait = cls.reserve(name, max_wait=max_wait)
+        except RateLimitExceeded:
+            with cls._metrics_lock:
+                cls._metrics['rejected'] += 1
+            raise
+        except Error as e:
+            # Senza database il limiter non deve bloccare le chiamate
+            logger.warning(f"Rate limiter {name} non disponibile: {e}")
+            wait = 0.0
+        cls._record(wait)
+        if wait >= SLOW_WAIT_SECONDS:
+            logger.info(f"Rate limiter {name}: attesa di {wait:.2f}s prima della chiamata")
+        return wait
+
+    @classmethod
+    def _record(cls, wait: float):
+        cls.add_thread_wait(wait)
+        with cls._metrics_lock:
+            cls._metrics['calls'] += 1
+            if wait > 0:
+                cls._metrics['waits'] += 1
+                cls._metrics['wait_seconds'] += wait
+                cls._metrics['max_wait_seconds'] = max(cls._metrics['max_wait_seconds'], wait)
+
+    @classmethod
+    def add_thread_wait(cls, seconds: float):
+        # Attese fatte per conto del thread corrente da altri thread (pool di fetch)
+        cls._local.wait_seconds = cls.thread_wait_seconds() + seconds
+
+    @classmethod
+    def thread_wait_seconds(cls) -> float:
+        # Totale delle attese del thread corrente: usato per attribuirle alla fase di fetch
+        return getattr(cls._local, 'wait_seconds', 0.0)
+
+    @classmethod
+    def status(cls, name: str = CHEAPSHARK_BUCKET) -> Dict:
+        """Configurazione, token disponibili ora nel bucket condiviso e metriche del processo."""
+        rate = cls._setting('CHEAPSHARK_RATE_LIMIT', None)
+        capacity = cls._setting('CHEAPSHARK_RATE_BURST', 1)
+        tokens = None
+        bucket = RateLimitBucket.objects.filter(name=name).values_list('tokens', 'updated_at').first()
+        if rate and bucket is not None:
+            tokens = round(min(capacity, bucket[0] + max(0.0, time.time() - bucket[1]) * rate), 3)
+        return {
+            'rate': rate,
+            'burst': capacity,
+            'max_wait': cls.get_max_wait(),
+            'tokens': tokens,
+            'process': cls.metrics(),
+        }
+
+    @classmethod
+    def metrics(cls) -> Dict:
+        with cls._metrics_lock:
+            return dict(cls._metrics)
+
+    @classmethod
+    def reset_metrics(cls):
+        with cls._metrics_lock:
+            cls._metrics.update(calls=0, waits=0, rejected=0, wait_seconds=0.0, max_wait_seconds=0.0)
+        cls._local.wait_seconds = 0.0
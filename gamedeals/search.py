@@ -0,0 +1,221 @@
+import logging
+from contextlib import contextmanager
+from typing import List
+
+from django.db import DatabaseError, connection, transaction
+from django.db.models import F, FloatField
+from django.db.models.expressions import RawSQL
+from rest_framework.filters import BaseFilterBackend
+
+logger = logging.getLogger(__name__)
+
+DEALS_TABLE = 'gamedeals_dealslist'
+FTS_TABLE = 'gamedeals_dealslist_fts'
+# Il tokenizer trigram indicizza ogni sottostringa di 3 caratteri: MATCH su una
+# frase equivale a un icontains, ma servito dall'indice invece che da un LIKE '%x%'
+MIN_TERM_LENGTH = 3
+
+SQLITE_FTS_SQL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        game_name, content='{DEALS_TABLE}', content_rowid='id', tokenize='trigram'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON {DEALS_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, game_name) VALUES (new.id, new.game_name);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON {DEALS_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, game_name) VALUES ('delete', old.id, old.game_name);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF game_name ON {DEALS_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, game_name) VALUES ('delete', old.id, old.game_name);
+        INSERT INTO {FTS_TABLE}(rowid, game_name) VALUES (new.id, new.game_name);
+    END""",
+]
+
+POSTGRES_TRGM_SQL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    f"""CREATE INDEX IF NOT EXISTS deals_game_name_trgm_idx
+        ON {DEALS_TABLE} USING gin (UPPER(game_name::text) gin_trgm_ops)""",
+]
+
+
+def _sqlite_triggers(cursor) -> int:
+    cursor.execute(
+        "SELECT COUNT(*) FROM sqlite_master WHERE type = 'trigger' AND name LIKE %s",
+        [f"{FTS_TABLE}_%"],
+    )
+    return cursor.fetchone()[0]
+
+
+def install_search_index(using_connection=None):
+    """
+    Crea (se mancano) gli indici di ricerca per il database in uso. Idempotente:
+    viene richiamata anche dopo ogni migrate perché su SQLite la ricostruzione
+    della tabella durante un AlterField elimina i trigger.
+    """
+    using_connection = using_connection or connection
+    try:
+        # Savepoint: dentro una transazione (es. una migrazione) un errore su Postgres
+        # la lascerebbe abortita e farebbe fallire anche le istruzioni successive
+        with transaction.atomic(using=using_connection.alias), using_connection.cursor() as cursor:
+            if using_connection.vendor == 'sqlite':
+                triggers_before = _sqlite_triggers(cursor)
+                for statement in SQLITE_FTS_SQL:
+                    cursor.execute(statement)
+                if triggers_before < 3:
+                    cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+                    logger.info("Indice FTS dei deal ricostruito")
+            elif using_connection.vendor == 'postgresql':
+                for statement in POSTGRES_TRGM_SQL:
+                    cursor.execute(statement)
+    except DatabaseError as e:
+        # SQLite senza FTS5/trigram o utente Postgres senza permessi sulle estensioni:
+        # la ricerca ricade su icontains
+        logger.warning(f"Indice di ricerca non disponibile: {e}")
+
+
+@contextmanager
+def search_index_suspended(using_connection=None):
+    """
+    Su SQLite il trigger di cancellazione aggiorna l'indice FTS riga per riga e
+    impedisce a DELETE senza WHERE di svuotare la tabella in un colpo solo: lo si
+    rimuove durante il blocco e alla fine si svuota l'indice con 'delete-all'.
+    Va usato dentro una transazione.
+    """
+    using_connection = using_connection or connection
+    if using_connection.vendor != 'sqlite':
+        yield
+        return
+
+    with using_connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT COUNT(*) FROM sqlite_master WHERE type = 'trigger' AND name = %s", [f"{FTS_TABLE}_ad"]
+        )
+        installed = cursor.fetchone()[0]
+        if installed:
+            cursor.execute(f"DROP TRIGGER {FTS_TABLE}_ad")
+
+    yield
+
+    if installed:
+        with using_connection.cursor() as cursor:
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('delete-all')")
+            cursor.execute(SQLITE_FTS_SQL[2])
+
+def reinstall_after_migrate(sender, using, **kwargs):
+    from django.db import connections
+    install_search_index(connections[using])
+    reset_search_backend()
+
+
+class BaseSearchBackend:
+    def contains(self, queryset, term: str):
+        return queryset.filter(game_name__icontains=term)
+
+    def search(self, queryset, term: str):
+        return self.contains(queryset, term), False
+
+
+class SqliteFTSBackend(BaseSearchBackend):
+    @staticmethod
+    def match_expression(terms: List[str]) -> str:
+        return ' '.join('"{}"'.format(term.replace('"', '""')) for term in terms)
+
+    def _split(self, term: str):
+        words = term.split()
+        indexed = [word for word in words if len(word) >= MIN_TERM_LENGTH]
+        short = [word for word in words if len(word) < MIN_TERM_LENGTH]
+        return indexed, short
+
+    def contains(self, queryset, term: str):
+        if len(term) < MIN_TERM_LENGTH:
+            return super().contains(queryset, term)
+        return queryset.filter(id__in=RawSQL(
+            f"SELECT rowid FROM {FTS_TABLE} WHERE game_name MATCH %s",
+            [self.match_expression([term])],
+        ))
+
+    def search(self, queryset, term: str):
+        indexed, short = self._split(term)
+        if not indexed:
+            return super().search(queryset, term)
+
+        match = self.match_expression(indexed)
+        queryset = queryset.filter(id__in=RawSQL(
+            f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [match]
+        ))
+        for word in short:
+            queryset = queryset.filter(game_name__icontains=word)
+        # bm25: valori più bassi indicano una corrispondenza migliore
+        queryset = queryset.annotate(search_rank=RawSQL(
+            f"SELECT rank FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s AND rowid = {DEALS_TABLE}.id",
+            [match],
+            output_field=FloatField(),
+        ))
+        return queryset.order_by('search_rank', 'pk'), True
+
+
+class PostgresTrigramBackend(BaseSearchBackend):
+    # icontains diventa UPPER(game_name) LIKE UPPER(...), servito dall'indice GIN trigram
+
+    def search(self, queryset, term: str):
+        from django.contrib.postgres.search import TrigramWordSimilarity
+
+        queryset = queryset.filter(game_name__icontains=term).annotate(
+            search_rank=TrigramWordSimilarity(term, 'game_name'),
+        )
+        return queryset.order_by(F('search_rank').desc(), 'pk'), True
+
+
+_backend = None
+
+
+def _sqlite_fts_available() -> bool:
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE]
+            )
+            return cursor.fetchone()[0] == 1 and _sqlite_triggers(cursor) >= 3
+    except DatabaseError:
+        return False
+
+
+def _postgres_trgm_available() -> bool:
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT COUNT(*) FROM pg_extension WHERE extname = 'pg_trgm'")
+            return cursor.fetchone()[0] == 1
+    except DatabaseError:
+        return False
+
+
+def get_search_backend() -> BaseSearchBackend:
+    global _backend
+    if _backend is None:
+        if connection.vendor == 'sqlite' and _sqlite_fts_available():
+            _backend = SqliteFTSBackend()
+        elif connection.vendor == 'postgresql' and _postgres_trgm_available():
+            _backend = PostgresTrigramBackend()
+        else:
+            _backend = BaseSearchBackend()
+    return _backend
+
+
+def reset_search_backend():
+    global _backend
+    _backend = None
+
+
+class DealSearchFilter(BaseFilterBackend):
+    search_param = 'search'
+
+    def filter_queryset(self, request, queryset, view):
+        term = request.query_params.get(self.search_param, '').strip()
+        if not term:
+            return queryset
+
+        ranked_queryset, ranked = get_search_backend().search(queryset, term)
+        # Un ordinamento esplicito del client ha la precedenza sul ranking
+        if ranked and request.query_params.get('ordering'):
+            return ranked_queryset.order_by(*queryset.query.order_by)
+        return ranked_queryset
@@ -1,6 +1,8 @@
+from decimal import Decimal
 from rest_framework import serializers
 from .models import DealsList, SyncLog, StoreInfo
 from django.contrib.auth.models import User
+from django.utils import timezone
 from django.contrib.auth.hashers import make_password
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 
@@ -12,12 +14,134 @@ class DealsListSerializer(serializers.ModelSerializer):
     store = StoreSerializer(read_only=True)
     class Meta:
         model = DealsList
-        fields = '__all__'
+        exclude = ['fingerprint', 'canonical_id']
+
+class DealsListReadSerializer(serializers.BaseSerializer):
+    """
+    Serializer in sola lettura per elenchi e dettaglio: produce lo stesso output
+    di DealsListSerializer senza istanziare un campo DRF per ogni attributo di ogni riga.
+    """
+    CENTS = Decimal('0.01')
+    TENTHS = Decimal('0.1')
+    DATETIME = serializers.DateTimeField(read_only=True)
+    
+    @staticmethod
+    def _decimal(value, places):
+        if value is None:
+            return None
+        return '{:f}'.format(Decimal(value).quantize(places))
+    
+    @staticmethod
+    def store_representation(store):
+        if store is None:
+            return None
+        return {
+            'id': store.id,
+            'store_id': store.store_id,
+            'store_name': store.store_name,
+            'store_logo_url': store.store_logo_url,
+            'store_banner_url': store.store_banner_url,
+            'store_icon_url': store.store_icon_url,
+        }
+    
+    def to_representation(self, deal):
+        return {
+            'id': deal.id,
+            'store': self.store_representation(deal.store),
+            'external_id': deal.external_id,
+            'game_name': deal.game_name,
+            'image_url': deal.image_url,
+            'saving': self._decimal(deal.saving, self.CENTS),
+            'sale_price': self._decimal(deal.sale_price, self.CENTS),
+            'normal_price': self._decimal(deal.normal_price, self.CENTS),
+            'deal_rating': self._decimal(deal.deal_rating, self.TENTHS),
+            'release_date': deal.release_date,
+            'rating_text': deal.rating_text,
+            'deal_link': deal.deal_link,
+            'last_change': deal.last_change,
+            'created_at': self.DATETIME.to_representation(deal.created_at),
+            'last_seen_at': self.DATETIME.to_representation(deal.last_seen_at),
+        }
+        
+class PriceHistorySerializer(serializers.BaseSerializer):
+    """Storia prezzi di un deal o di un gioco: i centesimi tornano importi decimali."""
+    
+    @staticmethod
+    def price(cents):
+        return f"{cents // 100}.{cents % 100:02d}"
+    
+    def point_representation(self, point, with_deal=False):
+        data = {
+            'recorded_at': DealsListReadSerializer.DATETIME.to_representation(point.recorded_at),
+            'sale_price': self.price(point.sale_cents),
+            'normal_price': self.price(point.normal_cents),
+        }
+        if with_deal:
+            data['external_id'] = point.deal.external_id
+            data['store_id'] = point.deal.store.store_id if point.deal.store else None
+        return data
+    
+    def to_representation(self, history):
+        with_deal = 'deal' not in history
+        lowest = history['lowest']
+        data = {
+            'lowest': self.point_representation(lowest, with_deal) if lowest else None,
+            'history': [self.point_representation(point, with_deal) for point in history['points']],
+        }
+        if with_deal:
+            data = {'game_name': history['game_name'], **data}
+        else:
+            data = {'id': history['deal'].id, 'external_id': history['deal'].external_id, **data}
+        return data
+        
+class DealAggregatesSerializer(serializers.BaseSerializer):
+    """Righe di aggregates.deal_aggregates nel formato dell'API."""
+    
+    @staticmethod
+    def buckets(buckets):
+        return [{'from': lower, 'to': upper, 'count': count} for lower, upper, count in buckets]
+    
+    def to_representation(self, row):
+        decimal = DealsListReadSerializer._decimal
+        cents = DealsListReadSerializer.CENTS
+        return {
+            'store_id': row['store__store_id'],
+            'store_name': row['store__store_name'],
+            'count': row['count'],
+            'sale_price': {
+                'min': decimal(row['min_sale_price'], cents),
+                'avg': decimal(row['avg_sale_price'], cents),
+                'max': decimal(row['max_sale_price'], cents),
+            },
+            'saving': {
+                'avg': decimal(row['avg_saving'], cents),
+                'histogram': self.buckets(row['saving_histogram']),
+            },
+            'deal_rating': {
+                'avg': decimal(row['avg_deal_rating'], DealsListReadSerializer.TENTHS),
+                'distribution': self.buckets(row['rating_distribution']),
+            },
+        }
         
 class SyncLogSerializer(serializers.ModelSerializer):
+    elapsed_seconds = serializers.SerializerMethodField()
+    rows_per_second = serializers.SerializerMethodField()
+    
     class Meta:
         model = SyncLog
         fields = '__all__'
+    
+    def get_elapsed_seconds(self, obj):
+        if obj.started_at is None:
+            return None
+        end = obj.finished_at or timezone.now()
+        return round((end - obj.started_at).total_seconds(), 3)
+    
+    def get_rows_per_second(self, obj):
+        elapsed = self.get_elapsed_seconds(obj)
+        if not elapsed:
+            return None
+        return round(obj.rows_written / elapsed, 1)
         
 class UserSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True)
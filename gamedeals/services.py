@@ -1,11 +1,143 @@
 import requests
-from typing import List, Dict, Optional
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+from requests.adapters import HTTPAdapter
+from typing import Iterator, List, Dict, Optional
 import logging
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+from .ratelimit import RateLimiter, RateLimitExceeded
 
 logger = logging.getLogger(__name__)
 
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+def run_in_worker_thread(func, *args, **kwargs):
+    # I thread dei pool non passano dal ciclo richiesta/risposta: le connessioni
+    # al database (usate dal rate limiter) vanno chiuse a mano come fa Django
+    close_old_connections()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+class CheapSharkClient:
+    """Sessione HTTP condivisa (keep-alive) con retry e backoff verso CheapShark."""
+    
+    _session: Optional[requests.Session] = None
+    _lock = threading.Lock()
+    
+    @staticmethod
+    def _setting(name: str, default):
+        return getattr(settings, name, default)
+    
+    @classmethod
+    def get_session(cls) -> requests.Session:
+        if cls._session is None:
+            with cls._lock:
+                if cls._session is None:
+                    pool_size = cls._setting('CHEAPSHARK_POOL_MAXSIZE', cls._setting('CHEAPSHARK_MAX_CONCURRENCY', 4))
+                    # I retry sono gestiti da get(): l'adapter non deve ritentare per conto suo
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=True, max_retries=0)
+                    session = requests.Session()
+                    session.mount('https://', adapter)
+                    session.mount('http://', adapter)
+                    cls._session = session
+        return cls._session
+    
+    @classmethod
+    def close(cls):
+        with cls._lock:
+            if cls._session is not None:
+                cls._session.close()
+                cls._session = None
+    
+    @classmethod
+    def _retry_after(cls, response: Optional[requests.Response]) -> Optional[float]:
+        if response is None:
+            return None
+        value = response.headers.get('Retry-After')
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            return max(0.0, (parsedate_to_datetime(value) - timezone.now()).total_seconds())
+        except (TypeError, ValueError):
+            return None
+    
+    @classmethod
+    def retry_delay(cls, attempt: int, response: Optional[requests.Response] = None) -> float:
+        max_delay = cls._setting('CHEAPSHARK_BACKOFF_MAX', 30.0)
+        retry_after = cls._retry_after(response)
+        if retry_after is not None:
+            return min(retry_after, max_delay)
+        # Backoff esponenziale con "full jitter"
+        base = cls._setting('CHEAPSHARK_BACKOFF_BASE', 0.5)
+        return random.uniform(0, min(max_delay, base * (2 ** attempt)))
+    
+    @classmethod
+    def wait_for_token(cls, fail_fast: bool = False):
+        # Dentro una richiesta HTTP (fail_fast) meglio un errore subito che un thread
+        # bloccato; i job in background attendono che il debito del bucket rientri
+        max_wait = cls._setting('CHEAPSHARK_RATE_INTERACTIVE_MAX_WAIT', 1.0) if fail_fast else None
+        while True:
+            try:
+                wait = RateLimiter.acquire(max_wait=max_wait)
+            except RateLimitExceeded as e:
+                if fail_fast:
+                    raise
+                time.sleep(e.retry_after)
+                continue
+            if wait:
+                time.sleep(wait)
+            return
+    
+    @classmethod
+    def get(cls, url: str, params: Optional[Dict] = None, timeout: Optional[float] = None,
+            fail_fast: bool = False) -> requests.Response:
+        max_retries = cls._setting('CHEAPSHARK_MAX_RETRIES', 3)
+        timeout = timeout or cls._setting('CHEAPSHARK_TIMEOUT', 10)
+        session = cls.get_session()
+        
+        attempt = 0
+        while True:
+            response = None
+            # Ogni tentativo, retry compresi, consuma un token del limiter condiviso
+            cls.wait_for_token(fail_fast=fail_fast)
+            try:
+                response = session.get(url, params=params, timeout=timeout)
+                if response.status_code not in RETRY_STATUS_CODES or attempt >= max_retries:
+                    response.raise_for_status()
+                    return response
+                reason = f"HTTP {response.status_code}"
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt >= max_retries:
+                    raise
+                reason = str(e)
+            
+            delay = cls.retry_delay(attempt, response)
+            attempt += 1
+            logger.warning(f"Richiesta a {url} fallita ({reason}), tentativo {attempt}/{max_retries} tra {delay:.2f}s")
+            if response is not None:
+                # Leggere il body riconsegna la connessione al pool invece di chiuderla
+                response.content
+            time.sleep(delay)
+
+
 class DealListService:
     BASE_URL = "https://www.cheapshark.com/api/1.0/deals"
+    # Dimensione massima di pagina accettata da CheapShark
+    MAX_PAGE_SIZE = 60
     
     @classmethod
     def fetch_games(cls, store_id: Optional[str] = None) -> List[Dict]:
@@ -14,8 +146,7 @@ class DealListService:
             }
             if store_id:
                 params['storeID'] = store_id
-            response = requests.get(cls.BASE_URL, params=params, timeout=10)
-            response.raise_for_status()
+            response = CheapSharkClient.get(cls.BASE_URL, params=params)
             
             games_data = response.json()
                     
@@ -28,55 +159,102 @@ class DealListService:
             return []
     
     @classmethod
-    def fetch_games_by_stores(cls, store_ids: List[str], base_games_per_store: int = 5, total_target: int = 16) -> List[Dict]:
-
-        all_games = []
-        extra_games_needed = total_target - (base_games_per_store * len(store_ids))
+    def iter_deal_pages(cls, store_id: Optional[str] = None, page_size: Optional[int] = None,
+                        max_pages: Optional[int] = None, **params) -> Iterator[List[Dict]]:
+        # Oltre il massimo la prima pagina arriverebbe "corta" e la paginazione si fermerebbe
+        page_size = min(page_size or getattr(settings, 'CHEAPSHARK_PAGE_SIZE', cls.MAX_PAGE_SIZE), cls.MAX_PAGE_SIZE)
+        page_number = 0
         
-        for store_id in store_ids:
+        while max_pages is None or page_number < max_pages:
+            page_params = dict(params, pageNumber=page_number, pageSize=page_size)
+            if store_id:
+                page_params['storeID'] = store_id
+            try:
+                response = CheapSharkClient.get(cls.BASE_URL, params=page_params)
+            except requests.RequestException as e:
+                logger.error(f"Errore nel recupero della pagina {page_number} (store {store_id}): {e}")
+                raise
+            
+            page = response.json()
+            if not page:
+                return
+            
+            logger.info(f"Recuperata pagina {page_number} con {len(page)} giochi (store {store_id})")
+            yield page
+            
+            total_pages = response.headers.get('X-Total-Page-Count')
+            page_number += 1
+            if len(page) < page_size or (total_pages is not None and page_number >= int(total_pages)):
+                return
+    
+    @classmethod
+    def fetch_stores_games(cls, store_ids: List[str], concurrent: bool = True, max_workers: Optional[int] = None) -> Dict[str, List[Dict]]:
+        
+        def fetch(store_id):
             try:
                 logger.info(f"Recupero giochi per store {store_id}")
-                store_games = cls.fetch_games(store_id=store_id)
-                
-                if store_games:
-                    selected_games = store_games[:base_games_per_store]
-                    all_games.extend(selected_games)
-                    logger.info(f"Aggiunti {len(selected_games)} giochi per store {store_id}")
-                else:
-                    logger.warning(f"Nessun gioco trovato per store {store_id}")
-                    
+                return cls.fetch_games(store_id=store_id)
             except Exception as e:
                 logger.error(f"Errore nel recupero giochi per store {store_id}: {e}")
-                continue
+                return []
+        
+        def fetch_in_pool(store_id):
+            waited_before = RateLimiter.thread_wait_seconds()
+            games = run_in_worker_thread(fetch, store_id)
+            return games, RateLimiter.thread_wait_seconds() - waited_before
+        
+        if not concurrent or len(store_ids) <= 1:
+            return {store_id: fetch(store_id) for store_id in store_ids}
+        
+        max_workers = max_workers or getattr(settings, 'CHEAPSHARK_MAX_CONCURRENCY', 4)
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(store_ids))) as executor:
+            results = list(executor.map(fetch_in_pool, store_ids))
+        # Le attese dei thread del pool vengono attribuite al chiamante
+        RateLimiter.add_thread_wait(sum(waited for _, waited in results))
+        return {store_id: games for store_id, (games, _) in zip(store_ids, results)}
+    
+    @classmethod
+    def fetch_games_by_stores(cls, store_ids: List[str], base_games_per_store: int = 5, total_target: int = 16,
+                              concurrent: bool = True, max_workers: Optional[int] = None) -> List[Dict]:
+
+        all_games = []
+        extra_games_needed = total_target - (base_games_per_store * len(store_ids))
+        games_by_store = cls.fetch_stores_games(store_ids, concurrent=concurrent, max_workers=max_workers)
+        
+        for store_id in store_ids:
+            store_games = games_by_store.get(store_id)
+            
+            if store_games:
+                selected_games = store_games[:base_games_per_store]
+                all_games.extend(selected_games)
+                logger.info(f"Aggiunti {len(selected_games)} giochi per store {store_id}")
+            else:
+                logger.warning(f"Nessun gioco trovato per store {store_id}")
         
         if extra_games_needed > 0 and len(all_games) < total_target:
             logger.info(f"Recupero {extra_games_needed} giochi extra")
             
+            # Le pagine già scaricate contengono anche i giochi oltre i primi
+            # base_games_per_store: non serve una seconda chiamata per store.
             for store_id in store_ids:
                 if extra_games_needed <= 0:
                     break
-                    
-                try:
-                    store_games = cls.fetch_games(store_id=store_id)
-                    
-                    if store_games and len(store_games) > base_games_per_store:
-                        extra_games = store_games[base_games_per_store:base_games_per_store + extra_games_needed]
-                        all_games.extend(extra_games)
-                        logger.info(f"Aggiunti {len(extra_games)} giochi extra per store {store_id}")
-                        extra_games_needed -= len(extra_games)
-                        
-                except Exception as e:
-                    logger.error(f"Errore nel recupero giochi extra per store {store_id}: {e}")
-                    continue
+                
+                store_games = games_by_store.get(store_id)
+                
+                if store_games and len(store_games) > base_games_per_store:
+                    extra_games = store_games[base_games_per_store:base_games_per_store + extra_games_needed]
+                    all_games.extend(extra_games)
+                    logger.info(f"Aggiunti {len(extra_games)} giochi extra per store {store_id}")
+                    extra_games_needed -= len(extra_games)
                 
         logger.info(f"Totale giochi recuperati: {len(all_games)}")
         return all_games[:total_target]
 
     @classmethod
-    def get_game_deals(cls, game_id: str) -> Optional[Dict]:
+    def get_game_deals(cls, game_id: str, fail_fast: bool = False) -> Optional[Dict]:
         try:
-            response = requests.get(f"{cls.BASE_URL}?id={game_id}", timeout=10)
-            response.raise_for_status()
+            response = CheapSharkClient.get(cls.BASE_URL, params={'id': game_id}, fail_fast=fail_fast)
             return response.json()
         except requests.RequestException as e:
             logger.error(f"Errore nel recupero del gioco {game_id}: {e}")
@@ -88,8 +266,7 @@ class StoreListService:
     @classmethod
     def fetch_stores(cls) -> List[Dict]:
         try:
-            response = requests.get(cls.BASE_URL, timeout=10)
-            response.raise_for_status()
+            response = CheapSharkClient.get(cls.BASE_URL)
             stores_data = response.json()
             logger.info(f"Recuperati {len(stores_data)} negozi dall'API")
             return stores_data
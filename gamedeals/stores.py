@@ -0,0 +1,62 @@
+import logging
+import threading
+from typing import Dict, Iterable, List, Optional
+
+from .models import StoreInfo
+
+logger = logging.getLogger(__name__)
+
+
+class StoreRegistry:
+    """
+    Gli store sono una manciata di righe: li si carica una volta sola e li si
+    risolve in memoria invece di interrogare il database per ogni deal.
+    """
+
+    _current = None
+    _current_lock = threading.Lock()
+
+    def __init__(self, stores: Optional[Iterable[StoreInfo]] = None):
+        if stores is None:
+            stores = StoreInfo.objects.order_by('pk')
+        self._stores = {store.store_id: store for store in stores}
+
+    def get(self, store_id: str) -> Optional[StoreInfo]:
+        return self._stores.get(store_id)
+
+    def all(self) -> List[StoreInfo]:
+        return list(self._stores.values())
+
+    def ensure(self, store_ids: Iterable[str], names: Optional[Dict[str, str]] = None) -> int:
+        """Crea in blocco gli store mancanti; restituisce quanti ne sono stati aggiunti."""
+        names = names or {}
+        missing = {store_id for store_id in store_ids if store_id and store_id not in self._stores}
+        if not missing:
+            return 0
+
+        StoreInfo.objects.bulk_create(
+            [StoreInfo(store_id=store_id, store_name=names.get(store_id, f"Store {store_id}")) for store_id in missing],
+            ignore_conflicts=True,
+        )
+        # Con ignore_conflicts le chiavi primarie non vengono restituite: si rileggono le righe
+        for store in StoreInfo.objects.filter(store_id__in=missing):
+            self._stores[store.store_id] = store
+        logger.info(f"Creati {len(missing)} store mancanti")
+        return len(missing)
+
+    @classmethod
+    def current(cls, generation: int) -> 'StoreRegistry':
+        # Istanza condivisa nel processo, valida finché non cambia la versione dei dati
+        cached = cls._current
+        if cached is not None and cached[0] == generation:
+            return cached[1]
+        with cls._current_lock:
+            cached = cls._current
+            if cached is None or cached[0] != generation:
+                cached = (generation, cls())
+                cls._current = cached
+        return cached[1]
+
+    @classmethod
+    def reset(cls):
+        cls._current = None
@@ -0,0 +1,185 @@
+import logging
+from typing import Callable, Dict, Optional
+
+from django.db import transaction
+from rest_framework import status
+
+from .caching import bump_generation
+from .ingestion import IngestStats, bulk_upsert_deals, ingest_catalogue, normalize_deal
+from .models import StoreInfo
+from .ratelimit import RateLimiter
+from .services import DealListService, StoreListService
+from .stores import StoreRegistry
+from .topdeals import rebuild_top_deals
+
+logger = logging.getLogger(__name__)
+
+allowed_store_ids = ['1', '7', '25']
+target_stores = {
+    '1': 'Steam',
+    '7': 'Humble Bundle',
+    '25': 'GOG'
+}
+IMAGE_BASE_URL = "https://www.cheapshark.com"
+
+SYNC_MODES = ('featured', 'full', 'incremental')
+
+
+class SyncError(Exception):
+    def __init__(self, message: str, status_code: int = status.HTTP_503_SERVICE_UNAVAILABLE):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+def sync_stores() -> Dict:
+    store_data = StoreListService.fetch_stores()
+
+    if not store_data:
+        raise SyncError("Impossibile recuperare gli store dall'API CheapShark")
+
+    created_count = 0
+    updated_count = 0
+
+    with transaction.atomic():
+        for store in store_data:
+
+            store_id = str(store.get('storeID', ''))
+            if store_id not in allowed_store_ids:
+                continue
+            store_obj, created = StoreInfo.objects.update_or_create(
+                store_id=store_id,
+                defaults={
+                    'store_name': store.get('storeName', 'Nome non disponibile'),
+                    "store_logo_url": IMAGE_BASE_URL + store.get("images", {}).get("logo", ""),
+                    "store_banner_url": IMAGE_BASE_URL + store.get("images", {}).get("banner", ""),
+                    "store_icon_url": IMAGE_BASE_URL + store.get("images", {}).get("icon", ""),
+                }
+            )
+
+            if created:
+                created_count += 1
+            else:
+                updated_count += 1
+
+    bump_generation()
+    return {
+        "message": "Sincronizzazione store completata",
+        "created": created_count,
+        "updated": updated_count
+    }
+
+
+def select_featured_games(target_store_ids, base_games_per_store=5, total_target=16):
+    try:
+        all_selected_games = DealListService.fetch_games_by_stores(
+            store_ids=target_store_ids,
+            base_games_per_store=base_games_per_store,
+            total_target=total_target
+        )
+    except Exception as e:
+        logger.error(f"Errore nel metodo fetch_games_by_stores: {e}")
+
+        games_data = DealListService.fetch_games()
+
+        if not games_data:
+            raise SyncError("Impossibile recuperare i giochi dall'API CheapShark")
+
+        games_by_store = {store_id: [] for store_id in target_store_ids}
+
+        for game in games_data:
+            store_id = game.get('storeID', '')
+            if store_id in target_store_ids:
+                games_by_store[store_id].append(game)
+
+        all_selected_games = []
+
+        for i in range(base_games_per_store):
+            for store_id in target_store_ids:
+                if len(games_by_store[store_id]) > i:
+                    all_selected_games.append(games_by_store[store_id][i])
+                    if len(all_selected_games) >= total_target:
+                        break
+            if len(all_selected_games) >= total_target:
+                break
+
+    return all_selected_games[:total_target]
+
+
+def sync_featured_deals(target_store_ids, progress: Optional[Callable[[IngestStats], None]] = None) -> Dict:
+    stats = IngestStats()
+    waited_before = RateLimiter.thread_wait_seconds()
+    with stats.timed('fetch'):
+        all_selected_games = select_featured_games(target_store_ids)
+    waited = RateLimiter.thread_wait_seconds() - waited_before
+    if waited:
+        stats.timings['rate_limit_wait'] = waited
+
+    if not all_selected_games:
+        raise SyncError("Nessun gioco trovato per gli store selezionati", status.HTTP_404_NOT_FOUND)
+
+    store_counts = {store_id: 0 for store_id in target_store_ids}
+    deals = []
+
+    with stats.timed('normalize'):
+        stores = StoreRegistry()
+        stores.ensure({game.get('storeID', '') for game in all_selected_games}, names=target_stores)
+
+        for game in all_selected_games:
+            store_id = game.get('storeID', '')
+            deals.append(normalize_deal(game, store=stores.get(store_id)))
+            store_counts[store_id] += 1
+
+    with stats.timed('write'):
+        stats.merge(bulk_upsert_deals(deals))
+    stats.pages = 1
+    if progress:
+        progress(stats)
+
+    return {
+        "message": "Sincronizzazione completata",
+        "created": stats.created,
+        "updated": stats.updated,
+        "unchanged": stats.unchanged,
+        "processed": stats.processed,
+        "distribution": {
+            target_stores[store_id]: store_counts.get(store_id, 0) for store_id in target_store_ids
+        },
+        "filtered_stores": [target_stores[store_id] for store_id in target_store_ids],
+        "timings": stats.timings,
+    }
+
+
+def sync_catalogue(target_store_ids, incremental=False,
+                   progress: Optional[Callable[[IngestStats], None]] = None) -> Dict:
+    try:
+        stats = ingest_catalogue(target_store_ids, incremental=incremental, progress=progress)
+    except Exception as e:
+        logger.error(f"Errore durante la sincronizzazione del catalogo: {e}")
+        raise SyncError(f"Errore durante la sincronizzazione del catalogo: {str(e)}")
+
+    return {
+        "message": "Sincronizzazione catalogo completata",
+        "created": stats.created,
+        "updated": stats.updated,
+        "unchanged": stats.unchanged,
+        "processed": stats.processed,
+        "pages": stats.pages,
+        "timings": stats.timings,
+    }
+
+
+def sync_deals(mode: str = 'featured', progress: Optional[Callable[[IngestStats], None]] = None) -> Dict:
+    if mode not in SYNC_MODES:
+        raise SyncError(f"Modalità di sincronizzazione non valida: {mode}", status.HTTP_400_BAD_REQUEST)
+
+    sync_stores()
+
+    try:
+        if mode == 'featured':
+            return sync_featured_deals(allowed_store_ids, progress=progress)
+        return sync_catalogue(allowed_store_ids, incremental=mode == 'incremental', progress=progress)
+    finally:
+        # Anche una sincronizzazione fallita può aver già scritto delle pagine
+        rebuild_top_deals()
+        bump_generation()
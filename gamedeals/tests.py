@@ -1,3 +1,1179 @@
-from django.test import TestCase
+import asyncio
+import base64
+import gc
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+
+from django.contrib.auth.models import User
+from django.db import InterfaceError, connection
+from django.db.models import F
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .async_services import AsyncCheapSharkClient, AsyncDealListService
+from .caching import bump_generation, get_cache
+from .jobs import SYNC_LOCK_NAME, SyncProgress, acquire_lock, enqueue_sync, release_lock, run_sync_now
+from .ingestion import IngestStats, bulk_upsert_deals, ingest_catalogue, ingest_pages, normalize_deal
+from .live import LiveDealService
+from .maintenance import cleanup_stale_deals
+from .ratelimit import RateLimiter, RateLimitExceeded
+from .models import DealsList, JobLock, PricePoint, RateLimitBucket, StoreInfo, StoreSyncState, SyncLog, TopDeal
+from .search import SqliteFTSBackend, get_search_backend, install_search_index
+from .serializers import DealsListReadSerializer, DealsListSerializer
+from .services import CheapSharkClient, DealListService, StoreListService
+from .stores import StoreRegistry
+from .sync import SyncError, sync_featured_deals
+from .topdeals import rebuild_top_deals
+
+
+def make_game(deal_id, **overrides):
+    game = {
+        'dealID': deal_id,
+        'storeID': '1',
+        'title': f"Gioco {deal_id}",
+        'thumb': 'https://example.com/thumb.jpg',
+        'savings': '50.123456',
+        'salePrice': '9.99',
+        'normalPrice': '19.99',
+        'dealRating': '8.5',
+        'releaseDate': 1700000000,
+        'steamRatingText': 'Very Positive',
+    }
+    game.update(overrides)
+    return game
+
+
+class StubCheapSharkServer:
+    """Server HTTP locale che risponde con una sequenza di risposte preimpostate."""
+
+    def __init__(self):
+        self.responses = []
+        self.requests = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                stub.requests.append({'path': self.path, 'client_port': self.client_address[1]})
+                status_code, body, headers = stub.responses.pop(0) if stub.responses else (200, [], {})
+                payload = json.dumps(body).encode()
+                self.send_response(status_code)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def enqueue(self, status_code=200, body=None, headers=None):
+        self.responses.append((status_code, body if body is not None else [], headers or {}))
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class StubServerMixin:
+    def setUp(self):
+        super().setUp()
+        CheapSharkClient.close()
+        self.stub = StubCheapSharkServer().__enter__()
+        self.addCleanup(self.stub.__exit__)
+        self.addCleanup(CheapSharkClient.close)
+        for service, path in ((DealListService, '/deals'), (StoreListService, '/stores')):
+            patcher = mock.patch.object(service, 'BASE_URL', self.stub.url + path)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        sleep_patcher = mock.patch('gamedeals.services.time.sleep')
+        self.sleep = sleep_patcher.start()
+        self.addCleanup(sleep_patcher.stop)
+        # Il limiter usa il database: i test del client lo escludono, RateLimiterTests lo copre
+        limiter_settings = override_settings(CHEAPSHARK_RATE_LIMIT=None)
+        limiter_settings.enable()
+        self.addCleanup(limiter_settings.disable)
+
+
+class CheapSharkClientTests(StubServerMixin, SimpleTestCase):
+    def test_reuses_connection(self):
+        self.stub.enqueue(body=[{'storeID': '1'}])
+        self.stub.enqueue(body=[{'storeID': '1'}])
+
+        self.assertEqual(len(StoreListService.fetch_stores()), 1)
+        self.assertEqual(len(StoreListService.fetch_stores()), 1)
+
+        ports = {request['client_port'] for request in self.stub.requests}
+        self.assertEqual(len(self.stub.requests), 2)
+        self.assertEqual(len(ports), 1)
+
+    def test_waits_for_rate_limiter_before_each_call(self):
+        self.stub.enqueue(body=[])
+
+        with mock.patch.object(RateLimiter, 'reserve', return_value=0.4):
+            StoreListService.fetch_stores()
+
+        self.sleep.assert_called_once_with(0.4)
+
+    def test_background_calls_wait_out_a_saturated_limiter(self):
+        self.stub.enqueue(body=[])
+
+        with mock.patch.object(RateLimiter, 'reserve', side_effect=[RateLimitExceeded(2.0), 0.0]):
+            StoreListService.fetch_stores()
+
+        self.sleep.assert_called_once_with(2.0)
+        self.assertEqual(len(self.stub.requests), 1)
+
+    def test_pool_waits_are_attributed_to_the_caller(self):
+        self.stub.enqueue(body=[make_game('deal-1')])
+        self.stub.enqueue(body=[make_game('deal-2', storeID='2')])
+        waited_before = RateLimiter.thread_wait_seconds()
+
+        with mock.patch.object(RateLimiter, 'reserve', return_value=0.25):
+            games = DealListService.fetch_stores_games(['1', '2'])
+
+        self.assertEqual(sum(len(store_games) for store_games in games.values()), 2)
+        self.assertEqual(RateLimiter.thread_wait_seconds() - waited_before, 0.5)
+
+    def test_retries_server_errors_with_backoff(self):
+        self.stub.enqueue(503)
+        self.stub.enqueue(502)
+        self.stub.enqueue(body=[make_game('deal-1')])
+
+        games = DealListService.fetch_games(store_id='1')
+
+        self.assertEqual([game['dealID'] for game in games], ['deal-1'])
+        self.assertEqual(len(self.stub.requests), 3)
+        self.assertEqual(self.sleep.call_count, 2)
+
+    def test_honors_retry_after(self):
+        self.stub.enqueue(429, headers={'Retry-After': '7'})
+        self.stub.enqueue(body=[])
+
+        DealListService.fetch_games()
+
+        self.sleep.assert_called_once_with(7.0)
+
+    def test_gives_up_after_max_retries(self):
+        for _ in range(10):
+            self.stub.enqueue(500)
+
+        with self.settings(CHEAPSHARK_MAX_RETRIES=2):
+            self.assertEqual(DealListService.fetch_games(), [])
+
+        self.assertEqual(len(self.stub.requests), 3)
+
+
+class DealPagesTests(StubServerMixin, SimpleTestCase):
+    def test_pages_are_fetched_lazily_until_exhaustion(self):
+        self.stub.enqueue(body=[make_game('deal-1'), make_game('deal-2')], headers={'X-Total-Page-Count': '2'})
+        self.stub.enqueue(body=[make_game('deal-3')], headers={'X-Total-Page-Count': '2'})
+
+        pages = DealListService.iter_deal_pages(store_id='1', page_size=2)
+        self.assertEqual(len(self.stub.requests), 0)
+
+        first_page = next(pages)
+        self.assertEqual(len(first_page), 2)
+        self.assertEqual(len(self.stub.requests), 1)
+        self.assertIn('pageNumber=0', self.stub.requests[0]['path'])
+
+        self.assertEqual([len(page) for page in pages], [1])
+        self.assertIn('pageNumber=1', self.stub.requests[1]['path'])
+        self.assertEqual(len(self.stub.requests), 2)
+
+    def test_page_size_is_capped_at_cheapshark_maximum(self):
+        full_page = [make_game(f"deal-{i}") for i in range(60)]
+        self.stub.enqueue(body=full_page)
+        self.stub.enqueue(body=[make_game('deal-60')])
+
+        pages = list(DealListService.iter_deal_pages(store_id='1', page_size=100))
+
+        self.assertEqual([len(page) for page in pages], [60, 1])
+        self.assertIn('pageSize=60', self.stub.requests[0]['path'])
+
+
+class IngestCatalogueTests(StubServerMixin, TestCase):
+    def test_writes_every_page(self):
+        StoreInfo.objects.create(store_id='1', store_name='Steam')
+        self.stub.enqueue(body=[make_game('deal-1'), make_game('deal-2')])
+        self.stub.enqueue(body=[make_game('deal-3'), make_game('deal-4')])
+        self.stub.enqueue(body=[])
+
+        stats = ingest_catalogue(['1'], page_size=2)
+
+        self.assertEqual((stats.pages, stats.created), (2, 4))
+        self.assertEqual(DealsList.objects.filter(store__store_id='1').count(), 4)
+
+
+    def test_incremental_stops_at_high_water_mark(self):
+        store = StoreInfo.objects.create(store_id='1', store_name='Steam')
+        StoreSyncState.objects.create(store=store, last_change=100)
+        self.stub.enqueue(body=[make_game('deal-1', lastChange=300), make_game('deal-2', lastChange=200)])
+        self.stub.enqueue(body=[make_game('deal-3', lastChange=150), make_game('deal-4', lastChange=90)])
+        self.stub.enqueue(body=[make_game('deal-5', lastChange=80), make_game('deal-6', lastChange=70)])
+
+        stats = ingest_catalogue(['1'], page_size=2, incremental=True)
+
+        self.assertEqual((stats.pages, stats.created), (2, 4))
+        self.assertEqual(len(self.stub.requests), 2)
+        self.assertIn('sortBy=Recent', self.stub.requests[0]['path'])
+        self.assertEqual(StoreSyncState.objects.get(store=store).last_change, 300)
+
+    def test_page_limit_keeps_high_water_mark(self):
+        store = StoreInfo.objects.create(store_id='1', store_name='Steam')
+        StoreSyncState.objects.create(store=store, last_change=100)
+        self.stub.enqueue(body=[make_game('deal-1', lastChange=300), make_game('deal-2', lastChange=200)])
+
+        stats = ingest_catalogue(['1'], page_size=2, incremental=True, max_pages=1)
+
+        # deal-3 (lastChange 150) non è stato letto: il prossimo giro deve ripartire da 100
+        self.assertTrue(stats.truncated)
+        self.assertEqual(len(self.stub.requests), 1)
+        self.assertEqual(StoreSyncState.objects.get(store=store).last_change, 100)
+
+    def test_mark_reached_within_page_limit_advances(self):
+        store = StoreInfo.objects.create(store_id='1', store_name='Steam')
+        StoreSyncState.objects.create(store=store, last_change=100)
+        self.stub.enqueue(body=[make_game('deal-1', lastChange=300), make_game('deal-2', lastChange=90)])
+
+        stats = ingest_catalogue(['1'], page_size=2, incremental=True, max_pages=1)
+
+        self.assertFalse(stats.truncated)
+        self.assertEqual(StoreSyncState.objects.get(store=store).last_change, 300)
+
+
+class BulkUpsertDealsTests(TestCase):
+    def setUp(self):
+        self.store = StoreInfo.objects.create(store_id='1', store_name='Steam')
+
+    def test_counts_created_and_updated(self):
+        deals = [normalize_deal(make_game(f"deal-{i}"), store=self.store) for i in range(5)]
+        stats = bulk_upsert_deals(deals, batch_size=2)
+        self.assertEqual((stats.created, stats.updated), (5, 0))
+
+        deals = [normalize_deal(make_game(f"deal-{i}", salePrice='4.99'), store=self.store) for i in range(3, 7)]
+        stats = bulk_upsert_deals(deals, batch_size=2)
+        self.assertEqual((stats.created, stats.updated, stats.unchanged), (2, 2, 0))
+
+        self.assertEqual(DealsList.objects.count(), 7)
+        self.assertEqual(str(DealsList.objects.get(external_id='deal-3').sale_price), '4.99')
+
+    def test_unchanged_deals_are_not_rewritten(self):
+        bulk_upsert_deals([normalize_deal(make_game('deal-1'), store=self.store)])
+        DealsList.objects.filter(external_id='deal-1').update(game_name='Modificato a mano')
+
+        stats = bulk_upsert_deals([normalize_deal(make_game('deal-1'), store=self.store)])
+
+        self.assertEqual((stats.created, stats.updated, stats.unchanged), (0, 0, 1))
+        self.assertEqual(DealsList.objects.get(external_id='deal-1').game_name, 'Modificato a mano')
+
+    def test_duplicate_deal_ids_in_batch_keep_last(self):
+        deals = [
+            normalize_deal(make_game('deal-1', salePrice='1.00'), store=self.store),
+            normalize_deal(make_game('deal-1', salePrice='2.00'), store=self.store),
+        ]
+        stats = bulk_upsert_deals(deals)
+        self.assertEqual((stats.created, stats.updated), (1, 0))
+        self.assertEqual(str(DealsList.objects.get(external_id='deal-1').sale_price), '2.00')
+
+
+    def test_unchanged_deals_refresh_last_seen_at(self):
+        bulk_upsert_deals([normalize_deal(make_game('deal-1'), store=self.store)])
+        long_ago = timezone.now() - timedelta(days=60)
+        DealsList.objects.filter(external_id='deal-1').update(last_seen_at=long_ago)
+
+        bulk_upsert_deals([normalize_deal(make_game('deal-1'), store=self.store)])
+
+        deal = DealsList.objects.get(external_id='deal-1')
+        self.assertGreater(deal.last_seen_at, long_ago)
+        self.assertLess(deal.created_at, deal.last_seen_at + timedelta(seconds=1))
+
+
+class CleanupStaleDealsTests(TestCase):
+    def setUp(self):
+        self.store = StoreInfo.objects.create(store_id='1', store_name='Steam')
+        bulk_upsert_deals([normalize_deal(make_game(f"deal-{i}"), store=self.store) for i in range(5)])
+        DealsList.objects.filter(external_id__in=['deal-0', 'deal-1', 'deal-2']).update(
+            last_seen_at=timezone.now() - timedelta(days=45)
+        )
+
+    def test_deletes_stale_deals_in_batches(self):
+        with mock.patch('gamedeals.maintenance.bump_generation') as bump:
+            deleted = cleanup_stale_deals(ttl_days=30, batch_size=2)
+
+        self.assertEqual(deleted, 3)
+        self.assertEqual(sorted(DealsList.objects.values_list('external_id', flat=True)), ['deal-3', 'deal-4'])
+        bump.assert_called_once()
+
+    def test_keeps_deals_reported_by_last_full_sync(self):
+        SyncLog.objects.create(
+            sync_type='automatic', status='success', mode='full',
+            started_at=timezone.now() - timedelta(days=50),
+        )
+
+        self.assertEqual(cleanup_stale_deals(ttl_days=30), 0)
+        self.assertEqual(DealsList.objects.count(), 5)
+
+
+class FetchGamesByStoresTests(SimpleTestCase):
+    def test_fetches_each_store_once_in_parallel(self):
+        barrier = threading.Barrier(3, timeout=5)
+
+        def fake_fetch(store_id=None):
+            # Se le chiamate fossero sequenziali la barriera andrebbe in timeout
+            barrier.wait()
+            return [make_game(f"{store_id}-{i}", storeID=store_id) for i in range(8)]
+
+        with mock.patch.object(DealListService, 'fetch_games', side_effect=fake_fetch) as fetch_games:
+            games = DealListService.fetch_games_by_stores(['1', '7', '25'], base_games_per_store=5, total_target=16)
+
+        self.assertEqual(fetch_games.call_count, 3)
+        self.assertEqual(len(games), 16)
+        self.assertEqual(games[-1]['dealID'], '1-5')
+
+
+class DealsAPITestCase(APITestCase):
+    def setUp(self):
+        super().setUp()
+        get_cache().clear()
+        StoreRegistry.reset()
+
+
+class AnonymousDealsSampleTests(DealsAPITestCase):
+    def setUp(self):
+        super().setUp()
+        stores = [StoreInfo.objects.create(store_id=store_id, store_name=f"Store {store_id}") for store_id in ('1', '7', '25', '30')]
+        deals = [
+            normalize_deal(make_game(f"{store.store_id}-{i}", salePrice=str(i)), store=store)
+            for store in stores for i in range(20)
+        ]
+        bulk_upsert_deals(deals)
+
+    def test_one_deal_per_sampled_store(self):
+        # Tabella dei top deal ancora vuota: versione dei dati, lettura dei top deal,
+        # DISTINCT store + (COUNT + riga casuale) per ciascuno dei 3 store scelti
+        with self.assertNumQueries(9):
+            response = self.client.get('/api/deals/')
+
+        results = response.json()['results']
+        self.assertEqual(len(results), 3)
+        self.assertEqual(len({deal['store']['store_id'] for deal in results}), 3)
+
+    def test_landing_page_reads_top_deals(self):
+        DealsList.objects.filter(external_id='1-7').update(deal_rating='10.0')
+        rebuild_top_deals(per_store=1)
+        self.assertEqual(TopDeal.objects.count(), 4)
+
+        # Versione dei dati + una lettura della tabella materializzata
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/deals/')
+
+        results = response.json()['results']
+        self.assertEqual(len({deal['store']['store_id'] for deal in results}), 3)
+        for deal in results:
+            if deal['store']['store_id'] == '1':
+                self.assertEqual(deal['external_id'], '1-7')
+
+    def test_rating_range_is_numeric(self):
+        DealsList.objects.filter(external_id='1-0').update(deal_rating='10.0')
+        DealsList.objects.filter(external_id='1-1').update(deal_rating='9.5')
+
+        response = self.client.get('/api/deals/', {'deal_rating__gte': '9.6'})
+
+        self.assertEqual([deal['external_id'] for deal in response.json()['results']], ['1-0'])
+
+    def test_keeps_filters(self):
+        response = self.client.get('/api/deals/', {'sale_price__lte': '0', 'store__store_name': 'Store 7'})
+
+        results = response.json()['results']
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0]['external_id'], '7-0')
+
+
+class DealsListQueryTests(DealsAPITestCase):
+    def setUp(self):
+        super().setUp()
+        stores = [StoreInfo.objects.create(store_id=store_id, store_name=f"Store {store_id}") for store_id in ('1', '7', '25')]
+        bulk_upsert_deals(
+            normalize_deal(make_game(f"{store.store_id}-{i}"), store=store)
+            for store in stores for i in range(10)
+        )
+        self.client.force_authenticate(User.objects.create_user(username='mario', password='password'))
+
+    def test_list_query_count_does_not_depend_on_page_size(self):
+        for limit in (2, 8, 30):
+            # Versione dei dati, COUNT per la paginazione e SELECT con JOIN sugli store
+            with self.assertNumQueries(3):
+                response = self.client.get('/api/deals/', {'limit': limit})
+            self.assertEqual(len(response.json()['results']), limit)
+
+    def test_retrieve_uses_single_query(self):
+        deal = DealsList.objects.first()
+        with self.assertNumQueries(2):
+            response = self.client.get(f"/api/deals/{deal.pk}/")
+        self.assertEqual(response.json()['store']['store_id'], deal.store.store_id)
+
+    def test_external_id_filter_accepts_encoded_and_decoded_ids(self):
+        store = StoreInfo.objects.get(store_id='1')
+        bulk_upsert_deals([normalize_deal(make_game('abc%2Bdef%3D'), store=store)])
+
+        for value in ('abc%2Bdef%3D', 'abc+def=', 'abc%252Bdef%253D'):
+            with self.assertNumQueries(3):
+                response = self.client.get('/api/deals/', {'external_id': value})
+            self.assertEqual([deal['external_id'] for deal in response.json()['results']], ['abc%2Bdef%3D'])
+
+    def test_read_serializer_matches_model_serializer(self):
+        DealsList.objects.filter(external_id='1-0').update(store=None)
+        for deal in DealsList.objects.select_related('store'):
+            self.assertEqual(DealsListReadSerializer(deal).data, DealsListSerializer(deal).data)
+
+
+class DealSearchTests(DealsAPITestCase):
+    def setUp(self):
+        super().setUp()
+        store = StoreInfo.objects.create(store_id='1', store_name='Steam')
+        titles = ['The Witcher 3: Wild Hunt', 'Witcher 2', 'Hollow Knight', 'Knights of the Old Republic']
+        bulk_upsert_deals(normalize_deal(make_game(f"deal-{i}", title=title), store=store) for i, title in enumerate(titles))
+
+    def names(self, response):
+        return [deal['game_name'] for deal in response.json()['results']]
+
+    def test_uses_fts_index_on_sqlite(self):
+        self.assertIsInstance(get_search_backend(), SqliteFTSBackend)
+
+    def test_icontains_filter_uses_index_with_same_semantics(self):
+        self.client.force_authenticate(User.objects.create_user(username='mario', password='password'))
+
+        response = self.client.get('/api/deals/', {'game_name__icontains': 'KNIGHT', 'ordering': 'game_name'})
+        self.assertEqual(self.names(response), ['Hollow Knight', 'Knights of the Old Republic'])
+
+        response = self.client.get('/api/deals/', {'game_name__icontains': 'ol'})
+        self.assertEqual(len(self.names(response)), 2)
+
+    def test_search_is_ranked_and_follows_updates(self):
+        self.client.force_authenticate(User.objects.create_user(username='mario', password='password'))
+        DealsList.objects.filter(external_id='deal-2').update(game_name='Witcher Adventure Game')
+        DealsList.objects.filter(external_id='deal-3').delete()
+
+        response = self.client.get('/api/deals/', {'search': 'witcher'})
+        self.assertEqual(set(self.names(response)), {'The Witcher 3: Wild Hunt', 'Witcher 2', 'Witcher Adventure Game'})
+
+        response = self.client.get('/api/deals/', {'search': 'knight'})
+        self.assertEqual(self.names(response), [])
+
+    def test_failed_install_is_rolled_back_to_a_savepoint(self):
+        statements = ["CREATE TABLE search_probe (id integer)", "CREATE VIRTUAL TABLE broken USING missing_module"]
+
+        with mock.patch('gamedeals.search.SQLITE_FTS_SQL', statements):
+            install_search_index()
+
+        # La transazione esterna resta utilizzabile e le istruzioni già eseguite vengono annullate
+        self.assertNotIn('search_probe', connection.introspection.table_names())
+        self.assertEqual(DealsList.objects.count(), 4)
+
+
+class ResponseCacheTests(DealsAPITestCase):
+    def setUp(self):
+        super().setUp()
+        store = StoreInfo.objects.create(store_id='1', store_name='Steam')
+        bulk_upsert_deals(normalize_deal(make_game(f"deal-{i}"), store=store) for i in range(5))
+        self.user = User.objects.create_user(username='mario', password='password')
+
+    def test_repeated_requests_are_served_from_cache(self):
+        self.client.force_authenticate(self.user)
+        first = self.client.get('/api/deals/', {'limit': 2, 'ordering': 'sale_price'})
+
+        # Solo la lettura della versione dei dati
+        with self.assertNumQueries(1):
+            second = self.client.get('/api/deals/', {'ordering': 'sale_price', 'limit': 2})
+
+        self.assertEqual(first.json(), second.json())
+
+    def test_sync_generation_invalidates_entries(self):
+        self.client.get('/api/store/')
+        StoreInfo.objects.create(store_id='7', store_name='Humble Bundle')
+        self.assertEqual(len(self.client.get('/api/store/').json()), 1)
+
+        bump_generation()
+
+        self.assertEqual(len(self.client.get('/api/store/').json()), 2)
+
+    def test_anonymous_and_authenticated_are_cached_separately(self):
+        anonymous = self.client.get('/api/deals/').json()
+        self.client.force_authenticate(self.user)
+        authenticated = self.client.get('/api/deals/').json()
+
+        self.assertNotIn('count', anonymous)
+        self.assertEqual(authenticated['count'], 5)
+
+
+
+class StoreRegistryTests(DealsAPITestCase):
+    def test_featured_sync_resolves_stores_without_per_deal_queries(self):
+        StoreInfo.objects.create(store_id='1', store_name='Steam')
+        games = [make_game(f"deal-{i}", storeID=store_id) for i in range(10) for store_id in ('1', '7')]
+
+        with mock.patch('gamedeals.sync.select_featured_games', return_value=games):
+            with CaptureQueriesContext(connection) as queries:
+                sync_featured_deals(['1', '7'])
+
+        store_queries = [q for q in queries.captured_queries if '"gamedeals_storeinfo"' in q['sql']]
+        # Lettura di tutti gli store, INSERT dei mancanti e rilettura delle righe create
+        self.assertEqual(len(store_queries), 3)
+        self.assertEqual(StoreInfo.objects.get(store_id='7').store_name, 'Humble Bundle')
+        self.assertEqual(DealsList.objects.filter(store__store_id='7').count(), 10)
+
+    def test_store_list_reuses_registry_until_next_generation(self):
+        StoreInfo.objects.create(store_id='1', store_name='Steam')
+        self.client.get('/api/store/')
+        get_cache().clear()
+
+        # Solo la lettura della versione dei dati
+        with self.assertNumQueries(1):
+            self.assertEqual(len(self.client.get('/api/store/').json()), 1)
+
+        StoreInfo.objects.create(store_id='7', store_name='Humble Bundle')
+        bump_generation()
+        self.assertEqual(len(self.client.get('/api/store/').json()), 2)
+
+class ConditionalGetTests(DealsAPITestCase):
+    def setUp(self):
+        super().setUp()
+        StoreInfo.objects.create(store_id='1', store_name='Steam')
+
+    def test_unchanged_data_returns_304_without_scanning(self):
+        response = self.client.get('/api/store/')
+        etag = response['ETag']
+
+        with self.assertNumQueries(1):
+            not_modified = self.client.get('/api/store/', HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified['ETag'], etag)
+
+    def test_if_modified_since(self):
+        response = self.client.get('/api/deals/')
+
+        not_modified = self.client.get('/api/deals/', HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+
+        self.assertEqual(not_modified.status_code, 304)
+
+    def test_sync_changes_validators(self):
+        etag = self.client.get('/api/store/')['ETag']
+
+        bump_generation()
+
+        response = self.client.get('/api/store/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_etag_is_specific_to_the_url(self):
+        store = StoreInfo.objects.get()
+        etag = self.client.get(f"/api/store/{store.pk}/")['ETag']
+
+        response = self.client.get('/api/store/999999/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 404)
+
+        response = self.client.get('/api/store/', {'ordering': 'store_name'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_missing_object_ignores_if_modified_since(self):
+        last_modified = self.client.get('/api/store/')['Last-Modified']
+
+        response = self.client.get('/api/store/999999/', HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 404)
+
+        response = self.client.get('/api/deals/999999/price_history/', HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 404)
+
+        response = self.client.get('/api/store/', HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+
+class KeysetPaginationTests(DealsAPITestCase):
+    def setUp(self):
+        super().setUp()
+        store = StoreInfo.objects.create(store_id='1', store_name='Steam')
+        # Prezzi ripetuti per verificare lo spareggio sull'id
+        bulk_upsert_deals(
+            normalize_deal(make_game(f"deal-{i}", salePrice=str(i % 4)), store=store) for i in range(11)
+        )
+        self.client.force_authenticate(User.objects.create_user(username='mario', password='password'))
+
+    def walk(self, params):
+        pages = []
+        response = self.client.get('/api/deals/', params).json()
+        pages.append(response)
+        while response['next']:
+            response = self.client.get(response['next']).json()
+            pages.append(response)
+        return pages
+
+    def test_walks_every_ordering_without_gaps_or_duplicates(self):
+        for ordering in ('sale_price', '-sale_price', 'game_name', '-deal_rating', ''):
+            pages = self.walk({'pagination': 'cursor', 'limit': 3, 'ordering': ordering})
+            ids = [deal['id'] for page in pages for deal in page['results']]
+
+            field = ordering.lstrip('-') or 'pk'
+            expected = DealsList.objects.order_by(
+                *([ordering, '-pk' if ordering.startswith('-') else 'pk'] if ordering else ['pk'])
+            ).values_list('pk', flat=True)
+            self.assertEqual(ids, list(expected), field)
+            self.assertEqual([len(page['results']) for page in pages], [3, 3, 3, 2])
+
+    def test_previous_link_returns_previous_page(self):
+        pages = self.walk({'pagination': 'cursor', 'limit': 4, 'ordering': '-sale_price'})
+
+        previous = self.client.get(pages[2]['previous']).json()
+
+        self.assertEqual(previous['results'], pages[1]['results'])
+        self.assertIsNone(pages[0]['previous'])
+
+    def test_count_is_opt_in(self):
+        response = self.client.get('/api/deals/', {'pagination': 'cursor'}).json()
+        self.assertNotIn('count', response)
+
+        response = self.client.get('/api/deals/', {'pagination': 'cursor', 'count': 'exact'}).json()
+        self.assertEqual((response['count'], response['count_is_approximate']), (11, False))
+
+        response = self.client.get('/api/deals/', {'pagination': 'cursor', 'count': 'approx'}).json()
+        self.assertEqual(response['count'], 11)
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/deals/', {'cursor': 'non-valido'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_cursor_reused_with_another_ordering(self):
+        next_url = self.client.get('/api/deals/', {'pagination': 'cursor', 'ordering': 'game_name'}).json()['next']
+        cursor = next_url.split('cursor=')[1].split('&')[0]
+
+        response = self.client.get('/api/deals/', {'cursor': cursor, 'ordering': 'sale_price'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_tampered_cursor_value(self):
+        payload = json.dumps({'f': 'sale_price', 'v': 'Gioco d1', 'id': 1, 'r': False})
+        cursor = base64.urlsafe_b64encode(payload.encode()).decode()
+
+        response = self.client.get('/api/deals/', {'cursor': cursor, 'ordering': 'sale_price'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_search_requires_explicit_ordering(self):
+        response = self.client.get('/api/deals/', {'pagination': 'cursor', 'search': 'gioco'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('pagination', response.json())
+
+        response = self.client.get('/api/deals/', {'pagination': 'cursor', 'search': 'gioco', 'ordering': 'sale_price'})
+        prices = [deal['sale_price'] for deal in response.json()['results']]
+        self.assertEqual(prices, sorted(prices))
+
+
+STORES_PAYLOAD = [
+    {'storeID': '1', 'storeName': 'Steam', 'images': {'logo': '/logo.png', 'banner': '/banner.png', 'icon': '/icon.png'}},
+    {'storeID': '2', 'storeName': 'GamersGate', 'images': {}},
+]
+
+
+class SyncJobTests(StubServerMixin, DealsAPITestCase):
+    def enqueue_catalogue(self):
+        self.stub.enqueue(body=STORES_PAYLOAD)
+        self.stub.enqueue(body=[make_game('deal-1'), make_game('deal-2')])
+        self.stub.enqueue(body=[])
+
+    @mock.patch('gamedeals.sync.allowed_store_ids', ['1'])
+    def test_api_enqueues_job_and_returns_id_to_poll(self):
+        self.enqueue_catalogue()
+
+        with self.settings(SYNC_JOBS_EAGER=True):
+            response = self.client.post('/api/deals/sync_from_cheapshark/?mode=full')
+
+        self.assertEqual(response.status_code, 202)
+        job = self.client.get(response.json()['status_url']).json()
+        self.assertEqual(job['status'], 'success')
+        self.assertEqual(job['deals_created'], 2)
+        self.assertEqual(job['result']['pages'], 1)
+        self.assertEqual((job['pages_fetched'], job['rows_written']), (1, 2))
+        self.assertEqual(set(job['phase_timings']), {'fetch', 'normalize', 'write'})
+        self.assertIsNotNone(job['elapsed_seconds'])
+        self.assertEqual(DealsList.objects.count(), 2)
+
+        history = self.client.get('/api/sync-jobs/', {'status': 'success'}).json()
+        self.assertEqual([entry['id'] for entry in history['results']], [job['id']])
+
+    def test_runs_off_the_request_after_commit(self):
+        with mock.patch('gamedeals.jobs.get_executor') as get_executor:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post('/api/deals/sync_from_cheapshark/')
+
+        self.assertEqual(response.json()['status'], 'queued')
+        get_executor.return_value.submit.assert_called_once()
+
+    def test_active_job_is_reused_only_for_the_same_mode(self):
+        with mock.patch('gamedeals.jobs.get_executor'):
+            first = enqueue_sync()
+            second = enqueue_sync()
+            response = self.client.post('/api/deals/sync_from_cheapshark/?mode=full')
+
+        self.assertEqual(first.pk, second.pk)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual((response.json()['job_id'], response.json()['mode']), (first.pk, 'featured'))
+
+    def test_orphaned_job_is_failed_and_replaced(self):
+        # Riga rimasta "running" da un worker riavviato: nessuno tiene più il lock
+        orphan = SyncLog.objects.create(sync_type='manual', status='running', mode='featured')
+
+        with mock.patch('gamedeals.jobs.get_executor'):
+            job = enqueue_sync()
+
+        orphan.refresh_from_db()
+        self.assertNotEqual(job.pk, orphan.pk)
+        self.assertEqual(orphan.status, 'failed')
+        self.assertEqual(JobLock.objects.get(name=SYNC_LOCK_NAME).job_id, job.pk)
+
+    def test_expired_lock_releases_the_job(self):
+        with mock.patch('gamedeals.jobs.get_executor'):
+            first = enqueue_sync()
+        JobLock.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+
+        with mock.patch('gamedeals.jobs.get_executor'):
+            second = enqueue_sync(mode='full')
+
+        first.refresh_from_db()
+        self.assertEqual(first.status, 'failed')
+        self.assertEqual(second.mode, 'full')
+
+    def test_progress_renews_the_lock(self):
+        with mock.patch('gamedeals.jobs.get_executor'):
+            job = enqueue_sync()
+        lock = JobLock.objects.get(name=SYNC_LOCK_NAME)
+        JobLock.objects.update(expires_at=timezone.now() + timedelta(seconds=5))
+
+        SyncProgress(job, lock_owner=lock.owner)(IngestStats(pages=1))
+
+        self.assertGreater(JobLock.objects.get().expires_at, timezone.now() + timedelta(seconds=60))
+
+        JobLock.objects.update(owner='altro-processo')
+        with self.assertRaises(SyncError):
+            SyncProgress(job, lock_owner=lock.owner)(IngestStats(pages=1))
+
+    def test_lock_prevents_overlapping_runs(self):
+        owner = acquire_lock(SYNC_LOCK_NAME)
+        self.addCleanup(release_lock, SYNC_LOCK_NAME, owner)
+
+        log = run_sync_now(mode='full')
+
+        self.assertEqual(log.status, 'failed')
+        self.assertEqual(self.stub.requests, [])
+        self.assertIsNone(acquire_lock(SYNC_LOCK_NAME))
+
+
+class ResetDealsTests(DealsAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(User.objects.create_user(username='mario', password='password'))
+        self.store = StoreInfo.objects.create(store_id='1', store_name='Steam')
+        StoreSyncState.objects.create(store=self.store, last_change=1700000000)
+        bulk_upsert_deals([normalize_deal(make_game(f"deal-{i}", title=f"Witcher {i}"), store=self.store) for i in range(3)])
+
+    def test_reset_keeps_stores_on_request(self):
+        response = self.client.delete('/api/deals/delete_local_deals/?keep_stores=true')
+
+        self.assertEqual(response.json()['message'], 'Eliminati 3 deals')
+        self.assertFalse(DealsList.objects.exists())
+        self.assertFalse(StoreSyncState.objects.exists())
+        self.assertTrue(StoreInfo.objects.filter(pk=self.store.pk).exists())
+
+    def test_reset_clears_stores_and_search_index(self):
+        self.client.delete('/api/deals/delete_local_deals/')
+        self.assertFalse(StoreInfo.objects.exists())
+
+        store = StoreInfo.objects.create(store_id='1', store_name='Steam')
+        bulk_upsert_deals([normalize_deal(make_game('deal-9', title='Witcher 9'), store=store)])
+        response = self.client.get('/api/deals/', {'search': 'witcher'})
+        self.assertEqual([deal['game_name'] for deal in response.json()['results']], ['Witcher 9'])
+
+
+
+class PriceHistoryTests(DealsAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.steam = StoreInfo.objects.create(store_id='1', store_name='Steam')
+        self.gog = StoreInfo.objects.create(store_id='25', store_name='GOG')
+
+    def sync(self, deal_id, sale_price, store=None, **overrides):
+        bulk_upsert_deals([normalize_deal(
+            make_game(deal_id, salePrice=sale_price, normalPrice='19.99', **overrides), store=store or self.steam
+        )])
+
+    def test_points_are_appended_only_when_price_changes(self):
+        self.sync('deal-1', '9.99')
+        self.sync('deal-1', '9.99')
+        self.sync('deal-1', '9.99', title='Titolo rinominato')
+        self.sync('deal-1', '4.99')
+
+        points = PricePoint.objects.filter(deal__external_id='deal-1').order_by('recorded_at')
+        self.assertEqual([point.sale_cents for point in points], [999, 499])
+        self.assertEqual({point.normal_cents for point in points}, {1999})
+
+    def test_deal_history_reports_lowest_price(self):
+        self.sync('deal-1', '9.99')
+        self.sync('deal-1', '2.49')
+        self.sync('deal-1', '7.50')
+        deal = DealsList.objects.get(external_id='deal-1')
+
+        response = self.client.get(f"/api/deals/{deal.pk}/price_history/")
+
+        data = response.json()
+        self.assertEqual([point['sale_price'] for point in data['history']], ['9.99', '2.49', '7.50'])
+        self.assertEqual(data['lowest']['sale_price'], '2.49')
+
+    def test_game_history_spans_stores(self):
+        self.sync('deal-1', '9.99', title='Hollow Knight')
+        self.sync('deal-2', '5.00', store=self.gog, title='Hollow Knight')
+
+        response = self.client.get('/api/deals/game_price_history/', {'game_name': 'Hollow Knight'})
+
+        self.assertEqual(response.json()['lowest'], {
+            'recorded_at': response.json()['lowest']['recorded_at'],
+            'sale_price': '5.00',
+            'normal_price': '19.99',
+            'external_id': 'deal-2',
+            'store_id': '25',
+        })
+        self.assertEqual(len(response.json()['history']), 2)
+        self.assertEqual(self.client.get('/api/deals/game_price_history/', {'game_name': 'Nessuno'}).status_code, 404)
+
+
+class DealAggregatesTests(DealsAPITestCase):
+    def setUp(self):
+        super().setUp()
+        steam = StoreInfo.objects.create(store_id='1', store_name='Steam')
+        gog = StoreInfo.objects.create(store_id='25', store_name='GOG')
+        bulk_upsert_deals([
+            normalize_deal(make_game('deal-1', salePrice='5.00', savings='10', dealRating='9.0'), store=steam),
+            normalize_deal(make_game('deal-2', salePrice='15.00', savings='80', dealRating='3.5'), store=steam),
+            normalize_deal(make_game('deal-3', salePrice='20.00', savings='50', dealRating='8.0'), store=gog),
+        ])
+
+    def test_per_store_stats_in_one_grouped_query(self):
+        # Versione dei dati + la query raggruppata
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/deals/aggregates/')
+
+        data = response.json()
+        self.assertEqual(data['count'], 3)
+        steam, gog = data['stores']
+        self.assertEqual((steam['store_name'], steam['count']), ('Steam', 2))
+        self.assertEqual(steam['sale_price'], {'min': '5.00', 'avg': '10.00', 'max': '15.00'})
+        self.assertEqual([bucket['count'] for bucket in steam['saving']['histogram']], [1, 0, 0, 1])
+        self.assertEqual([bucket['count'] for bucket in steam['deal_rating']['distribution']], [0, 1, 0, 0, 1])
+        self.assertEqual(gog['deal_rating']['avg'], '8.0')
+
+    def test_respects_deal_filters(self):
+        data = self.client.get('/api/deals/aggregates/', {'sale_price__lte': '10'}).json()
+        self.assertEqual([(store['store_id'], store['count']) for store in data['stores']], [('1', 1)])
+
+    def test_invalid_filters_are_rejected(self):
+        response = self.client.get('/api/deals/aggregates/', {'sale_price__gte': 'abc'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('sale_price__gte', response.json())
+
+
+class AsyncCheapSharkClientTests(StubServerMixin, SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        sleep_patcher = mock.patch('gamedeals.async_services.asyncio.sleep', new=mock.AsyncMock())
+        self.async_sleep = sleep_patcher.start()
+        self.addCleanup(sleep_patcher.stop)
+
+    def test_retries_without_blocking_a_thread(self):
+        self.stub.enqueue(503, headers={'Retry-After': '2'})
+        self.stub.enqueue(body=[make_game('deal-1')])
+
+        async def fetch():
+            try:
+                return await AsyncDealListService.fetch_games(store_id='1')
+            finally:
+                await AsyncCheapSharkClient.aclose()
+
+        games = async_to_sync(fetch)()
+
+        self.assertEqual([game['dealID'] for game in games], ['deal-1'])
+        self.async_sleep.assert_awaited_once_with(2.0)
+        self.sleep.assert_not_called()
+
+    def test_fetches_stores_concurrently(self):
+        for _ in range(3):
+            self.stub.enqueue(body=[make_game('deal-1')])
+
+        async def fetch():
+            try:
+                return await AsyncDealListService.fetch_stores_games(['1', '7', '25'])
+            finally:
+                await AsyncCheapSharkClient.aclose()
+
+        games_by_store = async_to_sync(fetch)()
+
+        self.assertEqual(sorted(games_by_store), ['1', '25', '7'])
+        self.assertEqual({request['path'].split('storeID=')[1] for request in self.stub.requests}, {'1', '7', '25'})
+
+    def test_client_is_not_shared_across_event_loops(self):
+        async def get_client():
+            return AsyncCheapSharkClient.get_client()
+
+        # Nessun aclose(): il loop chiuso non deve lasciare un client riutilizzabile
+        first = asyncio.run(get_client())
+        gc.collect()
+        second = asyncio.run(get_client())
+        gc.collect()
+
+        self.assertIsNot(first, second)
+        self.assertEqual(len(AsyncCheapSharkClient._clients), 0)
+
+
+class AsyncReadPathTests(DealsAPITestCase):
+    def setUp(self):
+        super().setUp()
+        stores = [StoreInfo.objects.create(store_id=store_id, store_name=f"Store {store_id}") for store_id in ('1', '7')]
+        bulk_upsert_deals(
+            normalize_deal(make_game(f"{store.store_id}-{i}", salePrice=str(i)), store=store)
+            for store in stores for i in range(6)
+        )
+        self.user = User.objects.create_user(username='mario', password='password')
+        self.token = str(RefreshToken.for_user(self.user).access_token)
+
+    async def test_list_matches_wsgi_output(self):
+        params = {'limit': 4, 'offset': 4, 'ordering': '-sale_price', 'store__store_name': 'Store 7'}
+        headers = {'Authorization': f"Bearer {self.token}"}
+
+        async_data = (await self.async_client.get('/api/async/deals/', params, headers=headers)).json()
+        await sync_to_async(self.client.force_authenticate)(self.user)
+        wsgi_data = (await sync_to_async(self.client.get)('/api/deals/', params)).json()
+
+        self.assertEqual(async_data['results'], wsgi_data['results'])
+        self.assertEqual(async_data['count'], 6)
+        self.assertIsNone(async_data['next'])
+        self.assertIn('limit=4', async_data['previous'])
+
+    async def test_invalid_filters_and_cursor_mode_are_rejected(self):
+        headers = {'Authorization': f"Bearer {self.token}"}
+
+        response = await self.async_client.get('/api/async/deals/', {'sale_price__gte': 'abc'}, headers=headers)
+        await sync_to_async(self.client.force_authenticate)(self.user)
+        wsgi_response = await sync_to_async(self.client.get)('/api/deals/', {'sale_price__gte': 'abc'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), wsgi_response.json())
+
+        response = await self.async_client.get('/api/async/deals/', {'pagination': 'cursor'}, headers=headers)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('pagination', response.json())
+
+    async def test_anonymous_list_samples_and_rejects_bad_tokens(self):
+        response = await self.async_client.get('/api/async/deals/')
+        self.assertEqual(len(response.json()['results']), 2)
+        self.assertIn('Authorization', response['Vary'])
+
+        response = await self.async_client.get('/api/async/deals/', headers={'Authorization': 'Bearer nope'})
+        self.assertEqual(response.status_code, 401)
+
+    async def test_detail_and_stores(self):
+        deal = await DealsList.objects.select_related('store').afirst()
+
+        response = await self.async_client.get(f"/api/async/deals/{deal.pk}/")
+        self.assertEqual(response.json(), DealsListReadSerializer(deal).data)
+        self.assertEqual((await self.async_client.get('/api/async/deals/999999/')).status_code, 404)
+        missing = await self.async_client.get(
+            '/api/async/deals/999999/', headers={'If-Modified-Since': response['Last-Modified']}
+        )
+        self.assertEqual(missing.status_code, 404)
+
+        etag = response['ETag']
+        not_modified = await self.async_client.get(f"/api/async/deals/{deal.pk}/", headers={'If-None-Match': etag})
+        self.assertEqual(not_modified.status_code, 304)
+
+        stores = (await self.async_client.get('/api/async/store/')).json()
+        self.assertEqual([store['store_id'] for store in stores], ['1', '7'])
+
+
+class LiveDealTests(StubServerMixin, DealsAPITestCase):
+    LOOKUP = {'gameInfo': {'name': 'Hollow Knight', 'salePrice': '7.49'}, 'cheaperStores': []}
+
+    def setUp(self):
+        super().setUp()
+        LiveDealService.reset()
+        self.addCleanup(LiveDealService.reset)
+
+    def test_miss_then_hit(self):
+        self.stub.enqueue(body=self.LOOKUP)
+
+        first = self.client.get('/api/deals/live/abc%253D/')
+        second = self.client.get('/api/deals/live/abc%3D/')
+
+        self.assertEqual((first['X-Cache'], second['X-Cache']), ('MISS', 'HIT'))
+        self.assertEqual(second.json(), self.LOOKUP)
+        self.assertEqual(len(self.stub.requests), 1)
+        self.assertIn('id=abc%3D', self.stub.requests[0]['path'])
+
+    def test_concurrent_requests_share_one_upstream_call(self):
+        release = threading.Event()
+        calls = []
+
+        def slow_lookup(deal_id, fail_fast=False):
+            calls.append(deal_id)
+            release.wait(5)
+            return self.LOOKUP
+
+        with mock.patch.object(DealListService, 'get_game_deals', side_effect=slow_lookup):
+            with ThreadPoolExecutor(max_workers=5) as executor:
+                futures = [executor.submit(LiveDealService.get, 'deal-1') for _ in range(5)]
+                time.sleep(0.2)
+                release.set()
+                results = [future.result(timeout=5) for future in futures]
+
+        self.assertEqual(calls, ['deal-1'])
+        self.assertEqual({data['gameInfo']['name'] for data, _ in results}, {'Hollow Knight'})
+
+    def test_serves_stale_while_revalidating(self):
+        self.stub.enqueue(body=self.LOOKUP)
+        self.stub.enqueue(body={'gameInfo': {'name': 'Hollow Knight', 'salePrice': '4.99'}, 'cheaperStores': []})
+        refreshes = []
+        refresh = LiveDealService.refresh_in_background
+
+        with self.settings(LIVE_DEAL_CACHE_TTL=0), mock.patch.object(
+            LiveDealService, 'refresh_in_background', side_effect=lambda key: refreshes.append(refresh(key))
+        ):
+            LiveDealService.get('deal-1')
+            data, state = LiveDealService.get('deal-1')
+            self.assertEqual((state, data['gameInfo']['salePrice']), ('STALE', '7.49'))
+
+            refreshes[0].result(timeout=5)
+            data, state = LiveDealService.get('deal-1')
+            # Anche questa lettura è stale e avvia un aggiornamento: lo si attende prima di chiudere lo stub
+            for future in refreshes[1:]:
+                if future is not None:
+                    future.result(timeout=5)
+
+        self.assertEqual(data['gameInfo']['salePrice'], '4.99')
+
+    def test_unknown_deal_is_404(self):
+        self.stub.enqueue(body=[])
+        response = self.client.get('/api/deals/live/missing/')
+        self.assertEqual(response.status_code, 404)
+
+    @override_settings(CHEAPSHARK_RATE_LIMIT=1.0, CHEAPSHARK_RATE_BURST=1, CHEAPSHARK_RATE_INTERACTIVE_MAX_WAIT=0.5)
+    def test_miss_fails_fast_when_limiter_is_saturated(self):
+        # Bucket in debito di 5 token: servirebbero 6 secondi di attesa
+        RateLimitBucket.objects.create(name='cheapshark', tokens=-5, updated_at=time.time())
+
+        response = self.client.get('/api/deals/live/deal-1/')
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(int(response['Retry-After']), 6)
+        self.assertEqual(self.stub.requests, [])
+
+
+@override_settings(CHEAPSHARK_RATE_LIMIT=2.0, CHEAPSHARK_RATE_BURST=3)
+class RateLimiterTests(TestCase):
+    def setUp(self):
+        RateLimiter.reset_metrics()
+        self.addCleanup(RateLimiter.reset_metrics)
+
+    def test_burst_then_paced_reservations(self):
+        with mock.patch('gamedeals.ratelimit.time.time', return_value=1000.0):
+            waits = [RateLimiter.acquire() for _ in range(5)]
+
+        # Tre token di raffica, poi un token ogni mezzo secondo prenotato in coda
+        self.assertEqual(waits, [0.0, 0.0, 0.0, 0.5, 1.0])
+        self.assertEqual(RateLimiter.metrics()['waits'], 2)
+        self.assertEqual(RateLimiter.metrics()['wait_seconds'], 1.5)
+
+        with mock.patch('gamedeals.ratelimit.time.time', return_value=1010.0):
+            self.assertEqual(RateLimiter.acquire(), 0.0)
+        self.assertEqual(RateLimitBucket.objects.get().tokens, 2.0)
+
+    def test_lost_compare_and_swap_is_retried(self):
+        RateLimiter.acquire()
+        original_filter = RateLimitBucket.objects.filter
+        raced = []
+
+        def racing_filter(*args, **kwargs):
+            # Un altro processo aggiorna la riga tra la lettura e l'UPDATE condizionato
+            if 'version' in kwargs and not raced:
+                raced.append(True)
+                original_filter(name=kwargs['name']).update(version=F('version') + 1)
+            return original_filter(*args, **kwargs)
+
+        with mock.patch.object(RateLimitBucket.objects, 'filter', side_effect=racing_filter):
+            RateLimiter.acquire()
+
+        self.assertEqual(RateLimitBucket.objects.get().version, 2)
+
+    def test_wait_beyond_max_wait_is_not_reserved(self):
+        with mock.patch('gamedeals.ratelimit.time.time', return_value=1000.0):
+            for _ in range(4):
+                RateLimiter.acquire()
+            version = RateLimitBucket.objects.get().version
+
+            with self.assertRaises(RateLimitExceeded) as raised:
+                RateLimiter.acquire(max_wait=0.5)
+
+        self.assertEqual(raised.exception.retry_after, 0.5)
+        self.assertEqual(RateLimitBucket.objects.get().version, version)
+        self.assertEqual(RateLimiter.metrics()['rejected'], 1)
+
+    def test_connection_errors_fail_open(self):
+        with mock.patch.object(RateLimiter, 'reserve', side_effect=InterfaceError('connection already closed')):
+            self.assertEqual(RateLimiter.acquire(), 0.0)
+
+    def test_status_endpoint_reports_bucket_and_process_metrics(self):
+        with mock.patch('gamedeals.ratelimit.time.time', return_value=1000.0):
+            RateLimiter.acquire()
+            response = self.client.get('/api/rate-limit/')
+
+        data = response.json()
+        self.assertEqual((data['rate'], data['burst'], data['tokens']), (2.0, 3, 2.0))
+        self.assertEqual(data['process']['calls'], 1)
+
+    def test_sync_reports_time_spent_waiting(self):
+        store = StoreInfo.objects.create(store_id='1', store_name='Steam')
+
+        def pages():
+            RateLimiter.acquire()
+            yield [make_game('deal-1')]
+
+        with mock.patch.object(RateLimiter, 'reserve', return_value=0.25):
+            stats = ingest_pages(pages(), store=store)
+
+        self.assertEqual(stats.timings['rate_limit_wait'], 0.25)
+        self.assertEqual(stats.created, 1)
+
+    @mock.patch('gamedeals.sync.allowed_store_ids', ['1'])
+    def test_featured_sync_reports_time_spent_waiting(self):
+        def fetch_games(store_id=None):
+            RateLimiter.acquire()
+            return [make_game('deal-1')]
+
+        with mock.patch.object(RateLimiter, 'reserve', return_value=0.25), \
+                mock.patch.object(DealListService, 'fetch_games', side_effect=fetch_games):
+            result = sync_featured_deals(['1'])
+
+        self.assertEqual(result['timings']['rate_limit_wait'], 0.25)
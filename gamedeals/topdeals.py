@@ -0,0 +1,79 @@
+import logging
+import random
+from typing import List, Optional
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import DealsList, StoreInfo, TopDeal
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TOP_DEALS_PER_STORE = 5
+TOP_DEALS_ORDERING = ('-deal_rating', '-saving', 'pk')
+
+
+def rebuild_top_deals(per_store: Optional[int] = None) -> int:
+    """Ricalcola i migliori deal di ogni store (per deal_rating e poi saving)."""
+    per_store = per_store or getattr(settings, 'TOP_DEALS_PER_STORE', DEFAULT_TOP_DEALS_PER_STORE)
+
+    rows = []
+    for store_id in StoreInfo.objects.values_list('pk', flat=True):
+        # Lettura limitata sull'indice (store, deal_rating): non dipende dalla dimensione del catalogo
+        deal_ids = DealsList.objects.filter(store_id=store_id).order_by(
+            *TOP_DEALS_ORDERING
+        ).values_list('pk', flat=True)[:per_store]
+        rows.extend(
+            TopDeal(store_id=store_id, deal_id=deal_id, rank=rank)
+            for rank, deal_id in enumerate(deal_ids, start=1)
+        )
+
+    with transaction.atomic():
+        TopDeal.objects.all().delete()
+        TopDeal.objects.bulk_create(rows)
+
+    logger.info(f"Top deals ricalcolati: {len(rows)} righe")
+    return len(rows)
+
+
+def sample_top_deals(max_stores: int = 3) -> Optional[List[DealsList]]:
+    """
+    Un deal casuale tra i migliori di max_stores store scelti a caso, con una sola query.
+    Restituisce None se la tabella non è ancora stata calcolata.
+    """
+    top_deals = list(TopDeal.objects.select_related('deal__store').order_by('store_id', 'rank'))
+    if not top_deals:
+        return None
+
+    by_store = {}
+    for top_deal in top_deals:
+        by_store.setdefault(top_deal.store_id, []).append(top_deal.deal)
+
+    selected_store_ids = random.sample(list(by_store), min(max_stores, len(by_store)))
+    return [random.choice(by_store[store_id]) for store_id in selected_store_ids]
+
+
+def sample_deals_per_store(queryset, max_stores: int = 3) -> List[DealsList]:
+    # Un deal casuale per store con COUNT + OFFSET: il costo dipende dal numero
+    # di store, non dal numero totale di deal
+    queryset = queryset.order_by()
+    all_store_ids = list(queryset.values_list("store_id", flat=True).distinct())
+    selected_store_ids = random.sample(all_store_ids, min(max_stores, len(all_store_ids)))
+
+    final_deals = []
+    for store_id in selected_store_ids:
+        store_deals = queryset.filter(store_id=store_id)
+        count = store_deals.count()
+        if count:
+            offset = random.randrange(count)
+            final_deals.extend(store_deals.order_by('pk')[offset:offset + 1])
+    return final_deals
+
+
+def landing_deals(queryset, filtered: bool = False) -> List[DealsList]:
+    """Deal mostrati agli utenti anonimi: dai top deal se non ci sono filtri, altrimenti campionati."""
+    if not filtered:
+        deals = sample_top_deals()
+        if deals is not None:
+            return deals
+    return sample_deals_per_store(queryset)
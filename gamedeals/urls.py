@@ -1,13 +1,20 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import DealsListViewSet, RegisterView, LoginView, StoreView
+from .views import DealsListViewSet, RegisterView, LoginView, StoreView, SyncJobView, RateLimitStatusView
+from . import async_views
 
 router = DefaultRouter()
 router.register(r'deals', DealsListViewSet, basename='deals')
 router.register(r'store', StoreView, basename='store')
+router.register(r'sync-jobs', SyncJobView, basename='sync-jobs')
 
 urlpatterns = [
     path('register/', RegisterView.as_view(), name="register"),
     path('login/', LoginView.as_view(), name="login"),
+    path('rate-limit/', RateLimitStatusView.as_view(), name="rate-limit"),
+    # Percorso di lettura asincrono, da servire con un worker ASGI
+    path('async/deals/', async_views.deals_list, name="async-deals-list"),
+    path('async/deals/<int:pk>/', async_views.deal_detail, name="async-deals-detail"),
+    path('async/store/', async_views.stores_list, name="async-store-list"),
     path('', include(router.urls)),
 ]
\ No newline at end of file
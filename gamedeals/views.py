@@ -2,37 +2,49 @@ from django.shortcuts import render
 import django_filters
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
-from django.db import transaction
+from rest_framework.reverse import reverse
+from rest_framework.views import APIView
 from rest_framework import generics
 from django.contrib.auth.models import User
 from rest_framework.permissions import AllowAny
 from rest_framework_simplejwt.views import TokenObtainPairView
-from .serializers import DealsListSerializer, UserSerializer, StoreSerializer, CustomLoginSerializer
-from .models import DealsList, StoreInfo
-from .services import DealListService, StoreListService
+from .serializers import DealsListSerializer, DealsListReadSerializer, UserSerializer, StoreSerializer, CustomLoginSerializer, SyncLogSerializer, PriceHistorySerializer, DealAggregatesSerializer
+from .models import DealsList, StoreInfo, SyncLog
+from .sync import SYNC_MODES, SyncError, sync_stores
+from .jobs import SyncConflict, enqueue_sync
+from .maintenance import reset_deals
+from .topdeals import landing_deals
+from .stores import StoreRegistry
+from .history import deal_price_history, game_price_history
+from .aggregates import deal_aggregates
+from .live import CACHE_MISS, LiveDealService
+from .ratelimit import RateLimiter, RateLimitExceeded
+from .search import DealSearchFilter, get_search_backend
+from .caching import CachedResponseMixin
 from rest_framework.pagination import LimitOffsetPagination
+from .pagination import DealsKeysetPagination, SyncLogPagination
 from rest_framework import filters
 from django_filters.rest_framework import DjangoFilterBackend
 import logging
-import random
-from urllib.parse import unquote, quote
+import math
 
 logger = logging.getLogger(__name__)
-allowed_store_ids = ['1', '7', '25']
 class DealsFilter(django_filters.FilterSet):
     external_id = django_filters.CharFilter(method='filter_external_id')
+    game_name__icontains = django_filters.CharFilter(field_name='game_name', method='filter_game_name_contains')
+    
+    def filter_game_name_contains(self, queryset, name, value):
+        if not value:
+            return queryset
+        return get_search_backend().contains(queryset, value)
     
     def filter_external_id(self, queryset, name, value):
         if not value:
             return queryset
-            
-        direct_match = queryset.filter(external_id=value)
-        if direct_match.exists():
-            return direct_match
-        
-        encoded_value = quote(value, safe='')
-        return queryset.filter(external_id=encoded_value)
+        # Una sola ricerca sull'indice, qualunque sia la codifica dell'id ricevuto
+        return queryset.filter(canonical_id=DealsList.canonical_external_id(value))
     
     class Meta:
         model = DealsList
@@ -40,88 +52,118 @@ class DealsFilter(django_filters.FilterSet):
             'store__store_name': ['exact', 'icontains'],
             'sale_price': ['exact', 'gte', 'lte'],
             'deal_rating': ['exact', 'gte', 'lte'],
-            'game_name': ['icontains', 'exact'],
+            'saving': ['gte', 'lte'],
+            'release_date': ['gte', 'lte'],
+            'game_name': ['exact'],
         }
 
-class DealsListViewSet(viewsets.ModelViewSet):
-    queryset = DealsList.objects.all()
+def has_deal_filters(query_params) -> bool:
+    params = [*DealsFilter.base_filters, DealSearchFilter.search_param]
+    return any(query_params.get(name) for name in params)
+
+class DealsListViewSet(CachedResponseMixin, viewsets.ModelViewSet):
+    queryset = DealsList.objects.select_related('store')
     serializer_class = DealsListSerializer
-    filter_backends = [DjangoFilterBackend, filters.OrderingFilter, filters.SearchFilter]
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter, DealSearchFilter]
     filterset_class = DealsFilter
     ordering_fields = ['sale_price', 'deal_rating', 'game_name', 'saving']
     
+    def get_serializer_class(self):
+        if self.action in ('list', 'retrieve'):
+            return DealsListReadSerializer
+        return super().get_serializer_class()
+    
     def list(self, request, *args, **kwargs):
+        return self.cached_response(request, lambda: self.build_list_response(request))
+    
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(request, lambda: super(DealsListViewSet, self).retrieve(request, *args, **kwargs))
+    
+    def build_list_response(self, request):
         queryset =  self.filter_queryset(self.get_queryset())
 
         if not request.user.is_authenticated:
-            all_store_ids = list(queryset.values_list("store_id", flat=True).distinct())
-            
-            if len(all_store_ids) == 0:
-                return Response({"results": []})
-            
-            selected_store_ids = random.sample(all_store_ids, min(3, len(all_store_ids)))
-            
-            final_deals = []
-            for store_id in selected_store_ids:
-                deals = list(queryset.filter(store_id=store_id))
-                if deals:
-                    final_deals.append(random.choice(deals))
-            
+            final_deals = landing_deals(queryset, filtered=self.has_filters(request))
             serializer = self.get_serializer(final_deals, many=True)
             
             return Response({"results": serializer.data})
-        paginator = LimitOffsetPagination()
-        paginator.default_limit = 8
-        result_page = paginator.paginate_queryset(queryset, request)
+        if DealsKeysetPagination.is_requested(request):
+            paginator = DealsKeysetPagination()
+        else:
+            paginator = LimitOffsetPagination()
+            paginator.default_limit = 8
+        result_page = paginator.paginate_queryset(queryset, request, view=self)
         serializer = self.get_serializer(result_page, many=True)
         
         
         return paginator.get_paginated_response(serializer.data)
           
+    def has_filters(self, request):
+        return has_deal_filters(request.query_params)
+          
+    @action(detail=False, methods=['get'], url_path=r'live/(?P<deal_id>.+)')
+    def live(self, request, deal_id=None):
+        # Dato in diretta da CheapShark: non passa dalla cache versionata delle risposte
+        try:
+            data, cache_state = LiveDealService.get(deal_id)
+        except RateLimitExceeded as e:
+            response = Response({"error": str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+            response['Retry-After'] = str(math.ceil(e.retry_after))
+            response['X-Cache'] = CACHE_MISS
+            return response
+        if data is None:
+            response = Response(
+                {"error": "Impossibile recuperare il deal da CheapShark"}, status=status.HTTP_502_BAD_GATEWAY
+            )
+        elif not data:
+            response = Response({"error": "Offerta non trovata."}, status=status.HTTP_404_NOT_FOUND)
+        else:
+            response = Response(data)
+        response['X-Cache'] = cache_state
+        return response
+    
+    @action(detail=True, methods=['get'])
+    def price_history(self, request, pk=None):
+        def build_response():
+            history = deal_price_history(self.get_object())
+            return Response(PriceHistorySerializer(history).data)
+        return self.cached_response(request, build_response)
+    
+    @action(detail=False, methods=['get'])
+    def game_price_history(self, request):
+        game_name = request.query_params.get('game_name', '').strip()
+        if not game_name:
+            return Response({"error": "Parametro game_name obbligatorio."}, status=status.HTTP_400_BAD_REQUEST)
+        
+        def build_response():
+            history = game_price_history(game_name)
+            if history is None:
+                return Response({"error": "Gioco non trovato."}, status=status.HTTP_404_NOT_FOUND)
+            return Response(PriceHistorySerializer(history).data)
+        return self.cached_response(request, build_response)
+    
+    @action(detail=False, methods=['get'])
+    def aggregates(self, request):
+        def build_response():
+            # Solo i filtri di DealsFilter: ricerca e ordinamento non hanno senso su dati aggregati
+            filterset = self.filterset_class(request.query_params, queryset=DealsList.objects.all())
+            if not filterset.is_valid():
+                raise ValidationError(filterset.errors)
+            queryset = filterset.qs
+            rows = deal_aggregates(queryset)
+            return Response({
+                "count": sum(row['count'] for row in rows),
+                "stores": DealAggregatesSerializer(rows, many=True).data,
+            })
+        return self.cached_response(request, build_response)
+    
     @action(detail=False, methods=['post'])
     def sync_stores(self, request):
 
         try:
-            store_data = StoreListService.fetch_stores()
-            
-            if not store_data:
-                return Response(
-                    {"error": "Impossibile recuperare gli store dall'API CheapShark"}, 
-                    status=status.HTTP_503_SERVICE_UNAVAILABLE
-                )
-            
-            created_count = 0
-            updated_count = 0
-            
-            with transaction.atomic():
-                IMAGE_BASE_URL = "https://www.cheapshark.com"
-                
-                for store in store_data:
-                    
-                    store_id = str(store.get('storeID', ''))
-                    if store_id not in allowed_store_ids:
-                        continue
-                    store_obj, created = StoreInfo.objects.update_or_create(
-                        store_id=str(store.get('storeID', '')),
-                        defaults={
-                            'store_name': store.get('storeName', 'Nome non disponibile'),
-                            "store_logo_url": IMAGE_BASE_URL + store.get("images", {}).get("logo", ""),
-                            "store_banner_url": IMAGE_BASE_URL + store.get("images", {}).get("banner", ""),
-                            "store_icon_url": IMAGE_BASE_URL + store.get("images", {}).get("icon", ""),
-                        }
-                    )
-                    
-                    if created:
-                        created_count += 1
-                    else:
-                        updated_count += 1
-            
-            return Response({
-                "message": "Sincronizzazione store completata",
-                "created": created_count,
-                "updated": updated_count
-            })
-            
+            return Response(sync_stores())
+        except SyncError as e:
+            return Response({"error": e.message}, status=e.status_code)
         except Exception as e:
             return Response(
                 {"error": f"Errore durante la sincronizzazione degli store: {str(e)}"}, 
@@ -131,132 +173,40 @@ class DealsListViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['post'])
     def sync_from_cheapshark(self, request):
         
-        store_sync_response = self.sync_stores(request)
-        if store_sync_response.status_code != 200:
-            return store_sync_response
-        
-        target_store_ids = ['1', '7', '25']
-        target_stores = {
-            '1': 'Steam',
-            '7': 'Humble Bundle', 
-            '25': 'GOG'
-        }
-        
-        try:
-            all_selected_games = DealListService.fetch_games_by_stores(
-                store_ids=target_store_ids, 
-                base_games_per_store=5,
-                total_target=16
-            )
-        except Exception as e:
-            logger.error(f"Errore nel metodo fetch_games_by_stores: {e}")
-
-            games_data = DealListService.fetch_games()
-            
-            if not games_data:
-                return Response(
-                    {"error": "Impossibile recuperare i giochi dall'API CheapShark"}, 
-                    status=status.HTTP_503_SERVICE_UNAVAILABLE
-                )
-            
-            games_by_store = {store_id: [] for store_id in target_store_ids}
-            
-            for game in games_data:
-                store_id = game.get('storeID', '')
-                if store_id in target_store_ids:
-                    games_by_store[store_id].append(game)
-            
-            all_selected_games = []
-            max_games = 5 
-            
-            for i in range(max_games):
-                for store_id in target_store_ids:
-                    if len(games_by_store[store_id]) > i:
-                        all_selected_games.append(games_by_store[store_id][i])
-                        if len(all_selected_games) >= 16:
-                            break
-                if len(all_selected_games) >= 16:
-                    break
-        
-        all_selected_games = all_selected_games[:16]
-        
-        if not all_selected_games:
+        mode = request.query_params.get('mode') or 'featured'
+        if mode not in SYNC_MODES:
             return Response(
-                {"error": "Nessun gioco trovato per gli store selezionati"}, 
-                status=status.HTTP_404_NOT_FOUND
+                {"error": f"Modalità di sincronizzazione non valida: {mode}"},
+                status=status.HTTP_400_BAD_REQUEST
             )
         
-        created_count = 0
-        updated_count = 0
-        processed_count = 0
-        store_counts = {store_id: 0 for store_id in target_store_ids}
+        try:
+            job = enqueue_sync(mode=mode)
+        except SyncConflict as e:
+            data = {"error": str(e)}
+            if e.job is not None:
+                data.update({
+                    "job_id": e.job.pk,
+                    "mode": e.job.mode,
+                    "status": e.job.status,
+                    "status_url": reverse('sync-jobs-detail', args=[e.job.pk], request=request),
+                })
+            return Response(data, status=status.HTTP_409_CONFLICT)
         
-        with transaction.atomic():
-            
-            for game in all_selected_games:
-                store_id = game.get('storeID', '')
-                
-                store_obj = None
-                if store_id:
-                    try:
-                        store_obj = StoreInfo.objects.get(store_id=store_id)
-                    except StoreInfo.DoesNotExist:
-                        store_obj = StoreInfo.objects.create(
-                            store_id=store_id,
-                            store_name=target_stores.get(store_id, f"Store {store_id}")
-                        )
-                        
-                deals_data = {
-                    'external_id': game.get('dealID', ''),
-                    'store': store_obj,
-                    'game_name': game.get('title', 'Nome non disponibile'),
-                    'image_url': game.get('thumb', ''),
-                    'saving': game.get("savings", 123),
-                    'sale_price': float(game.get('salePrice', 0)),
-                    'normal_price': float(game.get('normalPrice', 0)),
-                    'deal_rating': float(game.get('dealRating', 0)),
-                    'release_date': game.get('releaseDate', ''),
-                    'rating_text': game.get('steamRatingText', ''),
-                    'deal_link': f"https://www.cheapshark.com/redirect?dealID={game.get('dealID', '')}"
-                }
-                
-                deal, created = DealsList.objects.update_or_create(
-                    external_id=deals_data['external_id'],
-                    defaults=deals_data
-                )
-                
-                if created:
-                    created_count += 1
-                else:
-                    updated_count += 1
-                    
-                processed_count += 1
-                store_counts[store_id] += 1
-
         return Response({
-            "message": "Sincronizzazione completata",
-            "created": created_count,
-            "updated": updated_count,
-            "processed": processed_count,
-            "distribution": {
-                "Steam": store_counts.get('1', 0),
-                "Humble Bundle": store_counts.get('7', 0),
-                "GOG": store_counts.get('25', 0)
-            },
-            "filtered_stores": ["Steam", "Humble Bundle", "GOG"]
-        })
+            "message": "Sincronizzazione avviata",
+            "job_id": job.pk,
+            "status": job.status,
+            "status_url": reverse('sync-jobs-detail', args=[job.pk], request=request),
+        }, status=status.HTTP_202_ACCEPTED)
     
     @action(detail=False, methods=['delete'])
     def delete_local_deals(self, request, pk=None):
-        try:
-            count = DealsList.objects.count()
-            DealsList.objects.all().delete()
-            StoreInfo.objects.all().delete()
-            return Response({
-                "message": f"Eliminati {count} deals"
-            })
-        except DealsList.DoesNotExist:
-            return Response({"error": "Offerta non trovata."}, status=status.HTTP_404_NOT_FOUND)
+        keep_stores = request.query_params.get('keep_stores', '').lower() in ('1', 'true', 'yes')
+        count = reset_deals(keep_stores=keep_stores)
+        return Response({
+            "message": f"Eliminati {count} deals"
+        })
 
 class RegisterView(generics.CreateAPIView):
     queryset = User.objects.all()
@@ -276,11 +226,30 @@ class LoginView(TokenObtainPairView):
     permission_classes = [AllowAny]
     serializer_class = CustomLoginSerializer
 
-class StoreView(viewsets.ReadOnlyModelViewSet):
+class StoreView(CachedResponseMixin, viewsets.ReadOnlyModelViewSet):
     queryset = StoreInfo.objects.all()
     serializer_class = StoreSerializer
 
     def list(self, request, *args, **kwargs):
-        queryset = self.get_queryset()
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
\ No newline at end of file
+        return self.cached_response(request, lambda: self.build_list_response(request))
+    
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(request, lambda: super(StoreView, self).retrieve(request, *args, **kwargs))
+    
+    def build_list_response(self, request):
+        # Gli store cambiano solo con una sincronizzazione: la lista resta in memoria fino alla versione successiva
+        stores = StoreRegistry.current(self.data_version.version).all()
+        serializer = self.get_serializer(stores, many=True)
+        return Response(serializer.data)
+
+class SyncJobView(viewsets.ReadOnlyModelViewSet):
+    queryset = SyncLog.objects.all()
+    serializer_class = SyncLogSerializer
+    pagination_class = SyncLogPagination
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ['status', 'sync_type', 'mode']
+
+class RateLimitStatusView(APIView):
+    # Stato del limiter verso CheapShark: bucket condiviso e attese del processo che risponde
+    def get(self, request):
+        return Response(RateLimiter.status())
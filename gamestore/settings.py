@@ -75,6 +75,7 @@ INSTALLED_APPS = [
 
 CRONJOBS = [
     ('0 6 * * *', 'gamedeals.cron.daily_sync_deals'),
+    ('0 4 * * *', 'gamedeals.cron.cleanup_old_deals'),
 ]
 
 SIMPLE_JWT = {
@@ -174,3 +175,73 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# CheapShark sync
+
+# Numero di deal scritti per ogni INSERT ... ON CONFLICT durante la sincronizzazione
+DEALS_INGEST_BATCH_SIZE = 500
+
+# Richieste parallele massime verso CheapShark (una per store)
+CHEAPSHARK_MAX_CONCURRENCY = 4
+CHEAPSHARK_POOL_MAXSIZE = CHEAPSHARK_MAX_CONCURRENCY
+CHEAPSHARK_TIMEOUT = 10
+CHEAPSHARK_MAX_RETRIES = 3
+CHEAPSHARK_BACKOFF_BASE = 0.5
+CHEAPSHARK_BACKOFF_MAX = 30
+# Dimensione pagina per /deals (massimo consentito da CheapShark: 60)
+CHEAPSHARK_PAGE_SIZE = 60
+# Limite condiviso (tramite database) da tutti i worker e dal cron: richieste al secondo
+# verso CheapShark e raffica massima consentita. None disattiva il limiter
+CHEAPSHARK_RATE_LIMIT = 2.0
+CHEAPSHARK_RATE_BURST = 5
+# Attesa massima per un token (secondi): oltre, la chiamata non viene prenotata.
+# Le richieste HTTP (es. /api/deals/live/) usano la soglia più bassa e rispondono 503
+CHEAPSHARK_RATE_MAX_WAIT = 30
+CHEAPSHARK_RATE_INTERACTIVE_MAX_WAIT = 1.0
+
+# Cache delle risposte di /api/deals/ e /api/store/
+# Il backend si sceglie cambiando BACKEND, ad esempio:
+#   'django.core.cache.backends.filebased.FileBasedCache' con LOCATION = una cartella
+#   'django.core.cache.backends.redis.RedisCache' con LOCATION = 'redis://127.0.0.1:6379'
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'gamedeals': {
+        # LocMemCache elimina le chiavi usate meno di recente oltre MAX_ENTRIES
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'gamedeals-responses',
+        'TIMEOUT': 300,
+        'OPTIONS': {
+            'MAX_ENTRIES': 1000,
+        },
+    },
+}
+
+DEALS_CACHE_ALIAS = 'gamedeals'
+DEALS_CACHE_TIMEOUT = 300
+# Le risposte anonime contengono deal casuali: scadono prima
+DEALS_CACHE_ANONYMOUS_TIMEOUT = 60
+
+# Deal per store tenuti nella tabella materializzata della landing page
+TOP_DEALS_PER_STORE = 5
+
+# Dettaglio deal in diretta da CheapShark (/api/deals/live/<dealID>/)
+# Secondi in cui la risposta è considerata fresca
+LIVE_DEAL_CACHE_TTL = 60
+# Secondi successivi in cui si serve il dato vecchio mentre lo si aggiorna in background
+LIVE_DEAL_CACHE_STALE_TTL = 600
+LIVE_DEAL_CACHE_MAX_ENTRIES = 1000
+
+# Sincronizzazioni in background
+# Durata del lock sul database che impedisce sincronizzazioni sovrapposte (secondi).
+# Il job lo rinnova a ogni pagina: scade solo se il processo che lo esegue muore
+SYNC_LOCK_TTL = 600
+# True esegue i job nella richiesta stessa (utile nei test)
+SYNC_JOBS_EAGER = False
+
+# Pulizia dei deal non più riportati da CheapShark
+# Giorni dopo l'ultima volta in cui un deal è stato visto in una sincronizzazione
+DEALS_STALE_TTL_DAYS = 30
+# Righe eliminate per transazione
+DEALS_CLEANUP_BATCH_SIZE = 1000